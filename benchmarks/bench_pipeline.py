@@ -0,0 +1,367 @@
+"""Benchmark the walk / classify / collision / move pipeline on synthetic trees.
+
+Each scenario builds a tree in a temporary folder and times the phases of
+an organize run headlessly: the directory walk, classification, collision
+resolution, a full preview run and a real run. Every scenario runs in its
+own child process so its peak RSS is not inflated by the ones before it.
+
+    python benchmarks/bench_pipeline.py --quick
+    python benchmarks/bench_pipeline.py --files 1000000 -o after.json --compare before.json
+    python benchmarks/bench_pipeline.py deep --files 5000 --latency 2 --pipeline async
+
+``--latency`` adds a delay to every filesystem call while measuring (see
+``file_organizer.latency``), to compare the pipelines as if the tree were on
+a network share without needing one.
+
+Results are written as JSON so two checkouts can be compared on the same
+machine; ``--compare`` prints the change in files/sec per phase.
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import platform
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Benchmark the checkout this script lives in, not an installed copy.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from file_organizer import (  # noqa: E402
+    DEFAULT_FOLDERS,
+    DestinationIndex,
+    FileOrganizer,
+    OrganizeOptions,
+)
+from file_organizer.aio import PIPELINES  # noqa: E402
+from file_organizer.latency import SimulatedLatency  # noqa: E402
+
+SCENARIOS = ("flat", "deep", "collisions", "hidden", "preorganized")
+PHASES = ("walk", "classify", "collisions", "preview", "organize")
+
+# Extensions cycled through when naming files; the last ones map to "others".
+EXTENSIONS = [exts[0] for exts in DEFAULT_FOLDERS.values()] + ["xyz", "dat", ""]
+COLLIDING_NAMES = [f"IMG_{i:04d}.jpg" for i in range(25)] + [f"report {i}.pdf" for i in range(25)]
+DEEP_DEPTH = 32
+FILES_PER_DIR = 50
+
+# Builtins that are thin wrappers around system calls.
+_SYSCALL_PREFIXES = ("<built-in method posix.", "<built-in method nt.", "<built-in method io.open",
+                     "<method 'read' of", "<method 'write' of", "<built-in method _io.open")
+
+
+def _touch(path, size):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if size:
+            os.write(fd, b"\0" * size)
+    finally:
+        os.close(fd)
+
+
+def _file_name(i):
+    ext = EXTENSIONS[i % len(EXTENSIONS)]
+    return f"file{i}.{ext}" if ext else f"file{i}"
+
+
+def build_tree(scenario, base, files, size=0):
+    """Create the scenario's files under ``base``; returns whether the run should recurse."""
+    base = Path(base)
+    if scenario == "flat":
+        for i in range(files):
+            _touch(base / _file_name(i), size)
+        return False
+
+    if scenario == "deep":
+        # Chains of DEEP_DEPTH nested folders with FILES_PER_DIR files at every level.
+        i = 0
+        branch = 0
+        while i < files:
+            folder = base / f"branch{branch}"
+            for level in range(DEEP_DEPTH):
+                folder = folder / f"level{level}"
+                folder.mkdir(parents=True)
+                for _ in range(min(FILES_PER_DIR, files - i)):
+                    _touch(folder / _file_name(i), size)
+                    i += 1
+                if i >= files:
+                    break
+            branch += 1
+        return True
+
+    if scenario == "collisions":
+        # The same names in every folder, so every move after the first needs "name (N)".
+        folder_count = max(1, files // len(COLLIDING_NAMES))
+        for k in range(folder_count):
+            folder = base / f"import{k}"
+            folder.mkdir()
+            for name in COLLIDING_NAMES:
+                _touch(folder / name, size)
+        return True
+
+    if scenario == "hidden":
+        # Half of the files are hidden, and so are half of the folders.
+        for k in range(max(1, files // (2 * FILES_PER_DIR))):
+            visible = base / f"folder{k}"
+            hidden = base / f".cache{k}"
+            visible.mkdir()
+            hidden.mkdir()
+            for j in range(FILES_PER_DIR // 2):
+                i = k * FILES_PER_DIR + j
+                _touch(visible / _file_name(i), size)
+                _touch(visible / f".{_file_name(i)}", size)
+                _touch(hidden / _file_name(i), size)
+                _touch(hidden / f".{_file_name(i)}", size)
+        return True
+
+    if scenario == "preorganized":
+        # 95% already sorted into category folders, the rest loose at the top.
+        categories = list(DEFAULT_FOLDERS)
+        for category in categories:
+            (base / category).mkdir()
+        loose = max(1, files // 20)
+        for i in range(files - loose):
+            _touch(base / categories[i % len(categories)] / _file_name(i), size)
+        for i in range(loose):
+            _touch(base / f"loose{_file_name(i)}", size)
+        return True
+
+    raise ValueError(f"unknown scenario: {scenario}")
+
+
+def _phase(seconds, files):
+    return {
+        "seconds": round(seconds, 6),
+        "files": files,
+        "files_per_sec": round(files / seconds, 1) if seconds > 0 else None,
+    }
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def hot_spots(profiler, limit):
+    """Top functions by own time, and the subset that are system call wrappers."""
+    stats = pstats.Stats(profiler).stats
+    rows = []
+    for (filename, line, name), (_cc, calls, tottime, cumtime, _callers) in stats.items():
+        where = name if filename == "~" else f"{os.path.basename(filename)}:{line}({name})"
+        rows.append({"function": where, "calls": calls,
+                     "tottime": round(tottime, 6), "cumtime": round(cumtime, 6)})
+    rows.sort(key=lambda row: row["tottime"], reverse=True)
+    syscalls = [row for row in rows if row["function"].startswith(_SYSCALL_PREFIXES)]
+    return rows[:limit], syscalls[:limit]
+
+
+def scenario_options(recursive, args, **extra):
+    return OrganizeOptions(recursive=recursive, workers=args.workers, pipeline=args.pipeline,
+                           io_concurrency=args.io_concurrency, **extra)
+
+
+def measure(base, tmp_root, recursive, args, result):
+    """Time each phase on the tree at ``base``, filling in ``result``."""
+    def options(**extra):
+        return scenario_options(recursive, args, **extra)
+
+    organizer = FileOrganizer(dict(DEFAULT_FOLDERS), options())
+    phases = result["phases"] = {}
+
+    start = time.perf_counter()
+    found = sum(1 for _ in organizer.iter_files(base))
+    phases["walk"] = _phase(time.perf_counter() - start, found)
+    result["files"] = found
+
+    entries = list(organizer.iter_files(base))
+    start = time.perf_counter()
+    planned = [(base / organizer.category_for_entry(entry), entry.name) for entry in entries]
+    phases["classify"] = _phase(time.perf_counter() - start, len(entries))
+    del entries
+
+    destinations = DestinationIndex()
+    start = time.perf_counter()
+    for dest_dir, name in planned:
+        destinations.reserve(dest_dir, name)
+    phases["collisions"] = _phase(time.perf_counter() - start, len(planned))
+    del planned, destinations
+
+    start = time.perf_counter()
+    summary = FileOrganizer(dict(DEFAULT_FOLDERS), options(preview=True)).run(base)
+    phases["preview"] = _phase(time.perf_counter() - start, summary["processed"])
+
+    journal_dir = Path(tmp_root) / "journals" if args.journal else None
+    start = time.perf_counter()
+    summary = FileOrganizer(dict(DEFAULT_FOLDERS), options(journal_dir=journal_dir)).run(base)
+    phases["organize"] = _phase(time.perf_counter() - start, summary["moved"])
+    result["errors"] = summary["errors"]
+
+
+def run_scenario(scenario, args):
+    """Build, measure and tear down one scenario; returns its result dict."""
+    result = {"scenario": scenario}
+    tmp_root = tempfile.mkdtemp(prefix=f"bench-{scenario}-", dir=args.tmpdir)
+    try:
+        base = Path(tmp_root) / "tree"
+        base.mkdir()
+        start = time.perf_counter()
+        recursive = build_tree(scenario, base, args.files, args.file_size)
+        result["build_seconds"] = round(time.perf_counter() - start, 3)
+        result["recursive"] = recursive
+
+        latency = SimulatedLatency(args.latency / 1000.0) if args.latency else ExitStack()
+        with latency:
+            measure(base, tmp_root, recursive, args, result)
+        result["peak_rss_kb"] = peak_rss_kb()
+
+        if args.profile:
+            # Profile a real run on a fresh copy of the tree; profiler overhead
+            # would distort the timings above.
+            shutil.rmtree(base)
+            base.mkdir()
+            build_tree(scenario, base, args.files, args.file_size)
+            organizer = FileOrganizer(dict(DEFAULT_FOLDERS), scenario_options(recursive, args))
+            profiler = cProfile.Profile()
+            profiler.runcall(organizer.run, base)
+            result["hot_spots"], result["syscalls"] = hot_spots(profiler, args.top)
+    finally:
+        if args.keep:
+            print(f"kept {tmp_root}", file=sys.stderr)
+        else:
+            shutil.rmtree(tmp_root, ignore_errors=True)
+    return result
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(Path(__file__).parent),
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.decode().strip()
+
+
+def child_args(args, scenario):
+    argv = [sys.executable, os.path.abspath(__file__), "--child", scenario,
+            "--files", str(args.files), "--file-size", str(args.file_size),
+            "--workers", str(args.workers), "--top", str(args.top),
+            "--pipeline", args.pipeline, "--io-concurrency", str(args.io_concurrency),
+            "--latency", str(args.latency)]
+    if args.tmpdir:
+        argv += ["--tmpdir", args.tmpdir]
+    for flag in ("journal", "keep"):
+        if getattr(args, flag):
+            argv.append(f"--{flag}")
+    if not args.profile:
+        argv.append("--no-profile")
+    return argv
+
+
+def compare(results, baseline):
+    """Print files/sec per phase against an earlier results file."""
+    print(f"{'scenario':<14}{'phase':<12}{'before':>14}{'after':>14}{'change':>9}")
+    for scenario, result in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(scenario)
+        if old is None:
+            continue
+        for phase in PHASES:
+            before = old["phases"].get(phase, {}).get("files_per_sec")
+            after = result["phases"].get(phase, {}).get("files_per_sec")
+            if not before or not after:
+                continue
+            change = (after - before) / before * 100
+            print(f"{scenario:<14}{phase:<12}{before:>14,.0f}{after:>14,.0f}{change:>+8.1f}%")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--files", type=int, default=1000000,
+                        help="files per scenario (default: %(default)s)")
+    parser.add_argument("--quick", action="store_true", help="shorthand for --files 20000")
+    parser.add_argument("--file-size", type=int, default=0, metavar="BYTES",
+                        help="bytes written to every file (default: %(default)s)")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="parallel moves (default: %(default)s)")
+    parser.add_argument("--pipeline", choices=PIPELINES, default="sync",
+                        help="organize pipeline to measure (default: %(default)s)")
+    parser.add_argument("--io-concurrency", type=int, default=32, metavar="N",
+                        help="calls in flight for --pipeline async (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0, metavar="MS",
+                        help="add MS milliseconds to every filesystem call while measuring, "
+                             "like a network share (default: %(default)s)")
+    parser.add_argument("--journal", action="store_true", help="write a move journal during the real run")
+    parser.add_argument("--no-profile", dest="profile", action="store_false",
+                        help="skip the profiled run (and the hot spot report)")
+    parser.add_argument("--top", type=int, default=15, help="hot spots to report (default: %(default)s)")
+    parser.add_argument("--tmpdir", default=None, help="where trees are built (default: system temp dir)")
+    parser.add_argument("--keep", action="store_true", help="do not delete the trees afterwards")
+    parser.add_argument("-o", "--output", type=Path, default=None,
+                        help="write results to this JSON file (default: stdout)")
+    parser.add_argument("--compare", type=Path, default=None, metavar="BASELINE",
+                        help="print files/sec changes against an earlier results file")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+    if args.quick:
+        args.files = 20000
+
+    if args.child:
+        json.dump(run_scenario(args.child, args), sys.stdout)
+        return 0
+
+    results = {
+        "revision": git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {"files": args.files, "file_size": args.file_size, "workers": args.workers,
+                     "journal": args.journal, "pipeline": args.pipeline,
+                     "io_concurrency": args.io_concurrency, "latency_ms": args.latency},
+        "scenarios": {},
+    }
+    for scenario in args.scenarios or SCENARIOS:
+        print(f"{scenario}: building {args.files} files...", file=sys.stderr)
+        out = subprocess.run(child_args(args, scenario), stdout=subprocess.PIPE, check=True)
+        result = json.loads(out.stdout.decode())
+        results["scenarios"][scenario] = result
+        rates = ", ".join(f"{phase} {result['phases'][phase]['files_per_sec'] or 0:,.0f}/s"
+                          for phase in PHASES)
+        print(f"{scenario}: {result['files']} files; {rates}; peak RSS {result['peak_rss_kb']} KB",
+              file=sys.stderr)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text(encoding="utf-8")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Headless file organizing engine shared by the GUI and the ``file-organizer`` command."""
+
+from .engine import (
+    DEFAULT_FOLDERS,
+    DUPLICATES_FOLDER,
+    OTHERS_FOLDER,
+    DestinationIndex,
+    ExtensionClassifier,
+    FileEntry,
+    FileOrganizer,
+    OrganizeOptions,
+    Reporter,
+    default_config_path,
+    iter_files,
+    load_config,
+    normalize_extensions,
+    save_config,
+)
+from .aio import AsyncWalker
+from .batch import BatchJob, BatchRunner, load_batch
+from .control import RunControl
+from .dedup import DuplicateFinder
+from .executor import MoveExecutor, WorkerPool
+from .journal import MoveJournal, default_journal_dir, latest_journal, resume_journal, undo_journal
+from .latency import SimulatedLatency
+from .metrics import RunMetrics, format_report
+from .plan import MovePlan
+from .rules import RuleMatcher
+from .state import ScanState, default_state_path
+from .transfer import Transfer
+from .watch import FolderWatcher
+
+__all__ = [
+    "AsyncWalker",
+    "BatchJob",
+    "BatchRunner",
+    "DEFAULT_FOLDERS",
+    "DUPLICATES_FOLDER",
+    "OTHERS_FOLDER",
+    "DestinationIndex",
+    "DuplicateFinder",
+    "ExtensionClassifier",
+    "FileEntry",
+    "FileOrganizer",
+    "FolderWatcher",
+    "MoveExecutor",
+    "MoveJournal",
+    "MovePlan",
+    "OrganizeOptions",
+    "Reporter",
+    "RuleMatcher",
+    "RunControl",
+    "RunMetrics",
+    "ScanState",
+    "SimulatedLatency",
+    "Transfer",
+    "WorkerPool",
+    "default_config_path",
+    "default_journal_dir",
+    "default_state_path",
+    "format_report",
+    "iter_files",
+    "latest_journal",
+    "load_batch",
+    "load_config",
+    "normalize_extensions",
+    "resume_journal",
+    "save_config",
+    "undo_journal",
+]
@@ -0,0 +1,213 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .engine import IO_CONCURRENCY, left_unchanged, scan_dir
+
+PIPELINES = ("sync", "async")
+
+# Files stat'ed together and handed to the planning thread at once, and how
+# many such batches may wait for it before the walk holds back.
+BATCH_FILES = 256
+QUEUE_BATCHES = 16
+
+
+class AsyncWalker:
+    """``iter_files`` for high-latency mounts: many listings and stats in flight at once.
+
+    An asyncio loop on a background thread visits directories concurrently,
+    offloading every ``os.scandir`` and ``lstat`` to a thread pool, with at
+    most ``concurrency`` of them outstanding. Each file is stat'ed before it
+    is handed out, so ``entry.stat()`` in the planning loop is answered from
+    the DirEntry's cache instead of a round trip to the server.
+
+    Files come out in batches through a bounded queue, so a fast walk never
+    buffers a whole share in memory. Unlike ``iter_files`` the order depends
+    on which listings finish first.
+
+    The walk only reads ``state``. What it learned about a directory travels
+    through the queue behind that directory's last batch and is recorded by
+    the consuming thread once it asks for the next file, so a checkpoint
+    never marks a folder as done whose files have not been planned yet.
+    """
+
+    def __init__(self, base_folder, recursive=False, include_hidden=False, skip_roots=(),
+                 state=None, concurrency=IO_CONCURRENCY):
+        self.base_folder = os.fspath(base_folder)
+        self.recursive = recursive
+        self.include_hidden = include_hidden
+        self.skip_roots = skip_roots
+        self.state = state
+        self.concurrency = max(1, int(concurrency or 1))
+        self._queue = None
+        self._ready = threading.Event()
+
+    def __iter__(self):
+        loop = asyncio.new_event_loop()
+        main = []
+
+        def run_loop():
+            asyncio.set_event_loop(loop)
+            main.append(loop.create_task(self._main()))
+            try:
+                loop.run_until_complete(main[0])
+            except asyncio.CancelledError:
+                pass
+            finally:
+                loop.close()
+
+        thread = threading.Thread(target=run_loop, name="async-walk", daemon=True)
+        thread.start()
+        self._ready.wait()
+        try:
+            while True:
+                item = asyncio.run_coroutine_threadsafe(self._queue.get(), loop).result()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                batch, updates = item
+                for entry in batch:
+                    yield entry
+                for update in updates:
+                    update()
+        finally:
+            # Also stops a walk that is still going when the run is cancelled or fails.
+            if thread.is_alive():
+                loop.call_soon_threadsafe(main[0].cancel)
+            thread.join()
+
+    async def _main(self):
+        self._queue = asyncio.Queue(maxsize=QUEUE_BATCHES)
+        self._ready.set()
+        try:
+            await self._walk()
+            outcome = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            outcome = e
+        await self._queue.put(outcome)
+        # Keep the loop up until the planning thread has taken every batch.
+        await asyncio.Event().wait()
+
+    async def _walk(self):
+        loop = asyncio.get_event_loop()
+        pool = ThreadPoolExecutor(self.concurrency)
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+
+        async def io(fn, *args):
+            async with slots:
+                return await loop.run_in_executor(pool, fn, *args)
+
+        def visit(path, rel, at_root):
+            tasks.add(loop.create_task(self._visit(io, visit, path, rel, at_root)))
+
+        visit(self.base_folder, "", True)
+        try:
+            while tasks:
+                done, _pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                tasks.difference_update(done)
+                for task in done:
+                    task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            # Let calls already handed to the pool finish while the loop is still open.
+            pool.shutdown(wait=True)
+
+    async def _visit(self, io, visit, path, rel, at_root):
+        state = self.state
+        known = None
+        if state is not None:
+            try:
+                mtime_ns = (await io(os.stat, path)).st_mtime_ns
+            except OSError:
+                await self._queue.put(([], [partial(state.invalidate, rel)]))
+                return
+            unchanged = state.unchanged_subdirs(rel, mtime_ns)
+            if unchanged is not None:
+                if at_root:
+                    unchanged = [name for name in unchanged if name not in self.skip_roots]
+                if self.recursive:
+                    for name in unchanged:
+                        visit(os.path.join(path, name), os.path.join(rel, name), False)
+                return
+            known = state.known_entries(rel)
+        subdirs = []
+        files = await io(_listed, path, at_root, self.recursive, self.include_hidden,
+                         self.skip_roots, subdirs)
+        for name in subdirs:
+            visit(os.path.join(path, name), os.path.join(rel, name), False)
+        last = len(files) - BATCH_FILES
+        for start in range(0, max(len(files), 1), BATCH_FILES):
+            batch = files[start:start + BATCH_FILES]
+            await asyncio.gather(*(io(_prefetch_stat, entry) for entry in batch))
+            updates = _Updates(state)
+            if known:
+                batch = [entry for entry in batch if not left_unchanged(entry, known, updates, rel)]
+            if state is not None and start >= last:
+                updates.record_dir(rel, mtime_ns, subdirs)
+            if batch or updates:
+                await self._queue.put((batch, updates))
+
+
+class _Updates(list):
+    """Scan state changes made on behalf of the walk, applied by the consuming thread."""
+
+    def __init__(self, state):
+        super().__init__()
+        self.state = state
+
+    def record_entry(self, *args):
+        self.append(partial(self.state.record_entry, *args))
+
+    def record_dir(self, *args):
+        self.append(partial(self.state.record_dir, *args))
+
+
+def _listed(path, at_root, recursive, include_hidden, skip_roots, subdirs):
+    return list(scan_dir(path, at_root, recursive, include_hidden, skip_roots, subdirs))
+
+
+def _prefetch_stat(entry):
+    # DirEntry caches the result; for anything but a symlink it also answers stat().
+    try:
+        entry.stat(follow_symlinks=False)
+    except OSError:
+        pass
+
+
+def list_folders(paths, concurrency=IO_CONCURRENCY):
+    """``{path: set of names}`` for the folders among ``paths`` that exist, listed concurrently.
+
+    Used to learn the destination folders' contents up front instead of one
+    round trip at a time when the first file is planned into each.
+    """
+    paths = list(paths)
+    if not paths:
+        return {}
+    loop = asyncio.new_event_loop()
+    pool = ThreadPoolExecutor(max(1, min(int(concurrency or 1), len(paths))))
+
+    def names(path):
+        try:
+            with os.scandir(os.fspath(path)) as it:
+                return {entry.name for entry in it}
+        except OSError:
+            return None
+
+    async def list_all():
+        return await asyncio.gather(*(loop.run_in_executor(pool, names, path) for path in paths))
+
+    try:
+        listed = loop.run_until_complete(list_all())
+    finally:
+        pool.shutdown(wait=True)
+        loop.close()
+    return {path: found for path, found in zip(paths, listed) if found is not None}
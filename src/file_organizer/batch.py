@@ -0,0 +1,352 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from .aio import PIPELINES
+from .dedup import DEDUP_MODES
+from .engine import ExtensionClassifier, FileOrganizer, OrganizeOptions, Reporter, normalize_extensions
+from .executor import WorkerPool
+from .shard import ShardLayout
+from .sniff import SNIFF_MODES
+from .transfer import TRANSFER_MODES
+
+# Roots organized at the same time unless the batch says otherwise.
+PARALLEL_ROOTS = 4
+
+# Options a batch root or a profile may set. Worker counts are not among
+# them: the worker pool belongs to the whole batch.
+_FLAGS = ("recursive", "include_hidden", "preview", "create_folders", "full_rescan", "verify")
+_CHOICES = {"sniff": SNIFF_MODES, "dedup": DEDUP_MODES, "transfer": TRANSFER_MODES,
+            "pipeline": PIPELINES}
+ROOT_OPTIONS = _FLAGS + tuple(_CHOICES) + ("shard",)
+# Keys of a batch file next to "roots".
+BATCH_SETTINGS = ("workers", "per_device", "parallel_roots", "roots_per_device")
+
+
+def _root_options(spec, where):
+    options = {}
+    for key, value in spec.items():
+        if key not in ROOT_OPTIONS:
+            raise ValueError(f"{where}: unknown option {key!r}")
+        if key in _FLAGS:
+            if not isinstance(value, bool):
+                raise ValueError(f"{where}: {key} must be true or false")
+        elif key == "shard":
+            try:
+                ShardLayout.parse(value)
+            except ValueError as e:
+                raise ValueError(f"{where}: {e}")
+        elif value not in _CHOICES[key]:
+            raise ValueError(f"{where}: {key} must be one of {', '.join(_CHOICES[key])}")
+        options[key] = value
+    return options
+
+
+class Profile:
+    """A named entry of the config's ``_profiles``: categories, rules and option overrides.
+
+    ``folders`` and ``rules`` replace the main category mapping and
+    ``_rules`` when given; any other key is a root option such as
+    ``"recursive"`` or ``"shard"``. The classifier is compiled once and
+    shared by every root using the profile.
+    """
+
+    def __init__(self, name, spec, folders, rules=None):
+        where = "default profile" if name is None else f"profile {name!r}"
+        if not isinstance(spec, dict):
+            raise ValueError(f"{where} must be an object")
+        spec = dict(spec)
+        self.name = name
+        mapping = spec.pop("folders", None)
+        if mapping is None:
+            self.folders = folders
+        elif isinstance(mapping, dict) and all(isinstance(exts, list) for exts in mapping.values()):
+            self.folders = {category: normalize_extensions(exts) for category, exts in mapping.items()}
+        else:
+            raise ValueError(f"{where}: folders must map category names to extension lists")
+        self.rules = spec.pop("rules", rules)
+        self.options = _root_options(spec, where)
+        self.classifier = ExtensionClassifier(self.folders, self.rules)
+
+
+class BatchJob:
+    """One root of a batch: a folder, an optional profile name and option overrides."""
+
+    def __init__(self, folder, profile=None, options=None, name=None):
+        self.folder = Path(folder).expanduser()
+        self.profile = profile
+        self.options = options or {}
+        self.name = name
+
+    @classmethod
+    def from_spec(cls, spec, where):
+        """A job for ``"~/Downloads"`` or ``{"folder": ..., "profile": ..., "name": ..., <options>}``."""
+        if isinstance(spec, str):
+            return cls(spec)
+        if not isinstance(spec, dict) or not isinstance(spec.get("folder"), str):
+            raise ValueError(f"{where}: needs a folder")
+        spec = dict(spec)
+        folder = spec.pop("folder")
+        profile = spec.pop("profile", None)
+        name = spec.pop("name", None)
+        return cls(folder, profile, _root_options(spec, where), name)
+
+
+def load_batch(path):
+    """``(jobs, settings)`` from a batch file.
+
+    The file is JSON: either a list of roots, or an object with a ``roots``
+    list and batch-wide ``BATCH_SETTINGS``, which are passed on to
+    ``BatchRunner`` as keyword arguments. A root is a folder path or an
+    object with a ``folder`` and optionally a ``profile`` (from the config's
+    ``_profiles``), a ``name`` for reports and ``ROOT_OPTIONS``.
+    """
+    with Path(path).open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    settings = {}
+    roots = data
+    if isinstance(data, dict):
+        roots = data.get("roots")
+        for key, value in data.items():
+            if key == "roots":
+                continue
+            if key not in BATCH_SETTINGS:
+                raise ValueError(f"unknown batch setting {key!r}")
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError(f"{key} must be a number of at least 0")
+            settings[key] = value
+    if not isinstance(roots, list) or not roots:
+        raise ValueError("a batch needs a list of roots")
+    jobs = [BatchJob.from_spec(spec, f"root {number}") for number, spec in enumerate(roots, 1)]
+    return jobs, settings
+
+
+def _device_of(path):
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+class _RootReporter(Reporter):
+    """Tags a root's log lines and status with its name; progress adds up over the batch."""
+
+    def __init__(self, runner, index, label):
+        self.runner = runner
+        self.index = index
+        self.label = label
+
+    def log(self, message):
+        self.runner.reporter.log(f"[{self.label}] {message}")
+
+    def status(self, message):
+        self.runner.reporter.status(f"{self.label}: {message}")
+
+    def progress(self, processed, total):
+        self.runner._progress(self.index, processed)
+
+
+class BatchRunner:
+    """Organizes many root folders in one process.
+
+    Roots start in batch order, at most ``parallel_roots`` at a time and
+    at most ``roots_per_device`` on one storage device (0 = no extra
+    limit); a root waiting for its device lets later roots on other devices
+    go first. Each root is an ordinary ``FileOrganizer`` run with its own
+    journal, scan state and summary, but they all share one ``WorkerPool``
+    of ``workers`` threads, which takes turns between the roots and allows
+    ``per_device`` moves per device, and one compiled classifier per profile.
+
+    ``options`` are the defaults for every root; a root's profile options
+    apply on top of them, and the root's own options on top of those.
+    """
+
+    def __init__(self, folders, settings, options, jobs, reporter=None, control=None,
+                 workers=0, per_device=0, parallel_roots=0, roots_per_device=0):
+        self.folders = folders
+        self.settings = settings
+        self.options = options
+        self.jobs = list(jobs)
+        self.reporter = reporter or Reporter()
+        # One RunControl pauses or cancels every root; cancelled batches start no more roots.
+        self.control = control
+        self.parallel_roots = max(1, int(parallel_roots or PARALLEL_ROOTS))
+        if not workers:
+            workers = options.workers if options.workers > 1 else self.parallel_roots
+        self.workers = workers
+        self.per_device = per_device or options.per_device_workers
+        self.roots_per_device = roots_per_device
+        self._progress_lock = threading.Lock()
+        self._processed = [0] * len(self.jobs)
+        self._total = 0
+
+    def profiles(self):
+        """``{name: Profile}`` for the profiles the jobs use; the default one is under None."""
+        specs = self.settings.get("_profiles") or {}
+        if not isinstance(specs, dict):
+            raise ValueError("_profiles must map profile names to profiles")
+        profiles = {None: Profile(None, {}, self.folders, self.settings.get("_rules"))}
+        for number, job in enumerate(self.jobs, 1):
+            if job.profile in profiles:
+                continue
+            if job.profile not in specs:
+                raise ValueError(f"root {number}: unknown profile {job.profile!r}")
+            profiles[job.profile] = Profile(job.profile, specs[job.profile], self.folders,
+                                            self.settings.get("_rules"))
+        return profiles
+
+    def labels(self):
+        """Names for reports: the folder name, or the whole path where names repeat."""
+        names = [job.name or job.folder.name or str(job.folder) for job in self.jobs]
+        return [name if job.name or names.count(name) == 1 else str(job.folder)
+                for name, job in zip(names, self.jobs)]
+
+    def _progress(self, index, processed):
+        with self._progress_lock:
+            self._total += processed - self._processed[index]
+            self._processed[index] = processed
+            total = self._total
+        self.reporter.progress(total, None)
+
+    def run(self):
+        """Organize every root and return a summary with one summary per root under ``roots``."""
+        log = self.reporter.log
+        started = time.perf_counter()
+        summary = {"batch": True, "roots": [], "found": 0, "processed": 0, "moved": 0,
+                   "skipped": 0, "errors": 0, "failed_roots": 0}
+        try:
+            seen = set()
+            for number, job in enumerate(self.jobs, 1):
+                key = os.path.normcase(os.path.abspath(job.folder))
+                if key in seen:
+                    raise ValueError(f"root {number}: {job.folder} is listed twice")
+                seen.add(key)
+            profiles = self.profiles()
+        except ValueError as e:
+            log(f"Error: {e}")
+            self.reporter.status("Error occurred")
+            summary["error"] = str(e)
+            return summary
+
+        jobs = self.jobs
+        labels = self.labels()
+        devices = [_device_of(job.folder) for job in jobs]
+        results = [None] * len(jobs)
+        control = self.control
+        pool = WorkerPool(self.workers, self.per_device)
+        log(f"Organizing {len(jobs)} folders, {min(self.parallel_roots, len(jobs))} at a time, "
+            f"with {pool.workers} shared workers.")
+        cond = threading.Condition()
+        waiting = list(range(len(jobs)))
+        busy = {}
+        active = 0
+        threads = []
+
+        def device_free(index):
+            limit = self.roots_per_device
+            return not limit or busy.get(devices[index], 0) < limit
+
+        def run_root(index):
+            nonlocal active
+            try:
+                results[index] = self._run_root(index, profiles[jobs[index].profile], pool,
+                                                labels[index])
+            finally:
+                with cond:
+                    busy[devices[index]] -= 1
+                    active -= 1
+                    cond.notify()
+
+        with cond:
+            while waiting or active:
+                if control is not None and control.cancelled:
+                    # Roots already running stop after their current chunk.
+                    del waiting[:]
+                elif active < self.parallel_roots and not (control is not None and control.paused):
+                    index = next((i for i in waiting if device_free(i)), None)
+                    if index is not None:
+                        waiting.remove(index)
+                        busy[devices[index]] = busy.get(devices[index], 0) + 1
+                        active += 1
+                        thread = threading.Thread(target=run_root, args=(index,),
+                                                  name=f"batch-{index}", daemon=True)
+                        threads.append(thread)
+                        thread.start()
+                        continue
+                # Timed, so a cancel or resume is noticed without a root finishing.
+                cond.wait(0.5)
+        for thread in threads:
+            thread.join()
+        pool.shutdown()
+
+        for index, job in enumerate(jobs):
+            result = results[index]
+            if result is None:
+                result = {"folder": str(job.folder), "name": labels[index], "cancelled": True,
+                          "not_started": True}
+            summary["roots"].append(result)
+            for key in ("found", "processed", "moved", "skipped", "errors"):
+                summary[key] += result.get(key, 0)
+            if "error" in result:
+                summary["failed_roots"] += 1
+            if result.get("cancelled"):
+                summary["cancelled"] = True
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+
+        for line in format_batch_report(summary):
+            log(line)
+        processed = summary["processed"]
+        self.reporter.progress(processed, processed)
+        self.reporter.status("Cancelled" if summary.get("cancelled") else "Ready")
+        return summary
+
+    def _run_root(self, index, profile, pool, label):
+        job = self.jobs[index]
+        options = OrganizeOptions(**self.options.to_dict())
+        for key, value in list(profile.options.items()) + list(job.options.items()):
+            setattr(options, key, value)
+        # Plans are kept per run, and a batch has no single one to save.
+        options.record_plan = False
+        reporter = _RootReporter(self, index, label)
+        organizer = FileOrganizer(profile.folders, options, reporter, profile.classifier,
+                                  self.control, pool)
+        try:
+            summary = organizer.run(job.folder)
+        except Exception as e:
+            reporter.log(f"Error: {str(e)}")
+            summary = {"folder": str(job.folder), "error": str(e)}
+        summary["name"] = label
+        if profile.name is not None:
+            summary["profile"] = profile.name
+        return summary
+
+
+def format_batch_report(summary):
+    """Human-readable lines for a ``BatchRunner.run()`` summary: one per root, then the totals."""
+    lines = ["Results per folder:"]
+    for result in summary["roots"]:
+        label = result["name"]
+        if "profile" in result:
+            label += f" ({result['profile']})"
+        if "error" in result:
+            lines.append(f"  {label}: error: {result['error']}")
+            continue
+        if result.get("not_started"):
+            lines.append(f"  {label}: not started (cancelled)")
+            continue
+        done = (f"{result['processed']} planned" if result.get("preview")
+                else f"{result['moved']} moved")
+        seconds = result.get("metrics", {}).get("total_seconds", 0.0)
+        line = (f"  {label}: {result['found']} files, {done}, {result['skipped']} skipped, "
+                f"{result['errors']} errors in {seconds:.1f}s")
+        if result.get("cancelled"):
+            line += " (cancelled)"
+        lines.append(line)
+    failed = summary["failed_roots"]
+    failed = f", {failed} {'folder' if failed == 1 else 'folders'} failed" if failed else ""
+    lines.append(f"Batch of {len(summary['roots'])} folders: {summary['processed']} files processed, "
+                 f"{summary['moved']} moved, {summary['errors']} errors{failed} "
+                 f"in {summary['seconds']:.1f}s.")
+    return lines
@@ -0,0 +1,315 @@
+import argparse
+import json
+import multiprocessing
+import signal
+import sys
+from pathlib import Path
+
+from .aio import PIPELINES
+from .batch import BatchRunner, load_batch
+from .control import RunControl
+from .dedup import DEDUP_MODES
+from .engine import (
+    IO_CONCURRENCY,
+    ExtensionClassifier,
+    FileOrganizer,
+    OrganizeOptions,
+    Reporter,
+    default_config_path,
+    load_config,
+)
+from .journal import default_journal_dir, latest_journal, resume_journal, undo_journal
+from .metrics import write_batch_json, write_batch_textfile, write_json, write_textfile
+from .plan import MovePlan
+from .shard import ShardLayout
+from .sniff import SNIFF_MODES
+from .transfer import TRANSFER_MODES
+from .state import default_state_path
+
+
+class StreamReporter(Reporter):
+    """Writes log lines to a stream; status and progress are left to the log."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def log(self, message):
+        # One write per line, so lines of batch roots logging at once do not interleave.
+        self.stream.write(message + "\n")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="file-organizer",
+        description="Organize files into category subfolders. Starts the GUI when no folder is given.",
+    )
+    parser.add_argument("folder", nargs="?", help="folder to organize")
+    parser.add_argument("--batch", type=Path, default=None, metavar="FILE",
+                        help="organize every folder listed in FILE (JSON, see the README) in this "
+                             "process, sharing -j workers between them; the other options are "
+                             "the defaults for each folder")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="organize files in nested folders too")
+    parser.add_argument("--hidden", action="store_true", help="include hidden files")
+    parser.add_argument("-n", "--preview", action="store_true",
+                        help="show what would be moved without changing anything")
+    parser.add_argument("--no-create-folders", dest="create_folders", action="store_false",
+                        help="do not create missing category folders")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of parallel moves (default: %(default)s)")
+    parser.add_argument("--per-device", type=int, default=0, metavar="N",
+                        help="at most N parallel moves per storage device (default: no extra limit)")
+    parser.add_argument("--pipeline", choices=PIPELINES, default="sync",
+                        help="async keeps many listings, stats and renames in flight at once, "
+                             "for network shares where each call waits on the server "
+                             "(default: %(default)s)")
+    parser.add_argument("--io-concurrency", type=int, default=IO_CONCURRENCY, metavar="N",
+                        help="async pipeline: filesystem calls in flight, and parallel moves "
+                             "unless -j is given (default: %(default)s)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="remember folders between runs and skip the ones that did not change")
+    parser.add_argument("--state", type=Path, default=None, metavar="PATH",
+                        help="scan state file for --incremental (default: next to the config file)")
+    parser.add_argument("--full-rescan", action="store_true",
+                        help="walk everything and rebuild the scan state")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and organize new files as they arrive (Ctrl+C to stop)")
+    parser.add_argument("--settle", type=float, default=0.5, metavar="SECONDS",
+                        help="watch mode: how long a new file must stay unchanged (default: %(default)s)")
+    parser.add_argument("--poll", type=float, default=None, metavar="SECONDS",
+                        help="watch mode: poll at this interval instead of using inotify")
+    parser.add_argument("--journal-dir", type=Path, default=None, metavar="DIR",
+                        help="where move journals are written "
+                             "(default: 'journals' in the per-user data folder)")
+    parser.add_argument("--no-journal", action="store_true", help="do not write a move journal")
+    parser.add_argument("--undo", nargs="?", const="latest", metavar="JOURNAL",
+                        help="move the files of a journal (default: the latest) back where they were")
+    parser.add_argument("--resume", nargs="?", const="latest", metavar="JOURNAL",
+                        help="finish the planned moves of an interrupted run (default: the latest journal)")
+    parser.add_argument("--sniff", choices=SNIFF_MODES, default="off",
+                        help="detect file types from their first bytes: for files without a known "
+                             "extension, or for all files (default: %(default)s)")
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default="off",
+                        help="find byte-identical copies and skip them, replace them with hard "
+                             "links, or move them to a 'duplicates' folder (default: %(default)s)")
+    parser.add_argument("--transfer", choices=TRANSFER_MODES, default="move",
+                        help="move files, or leave them and put a copy, hard link, symbolic link "
+                             "or reflink (a copy sharing blocks, where the filesystem can) in the "
+                             "category folder (default: %(default)s)")
+    parser.add_argument("--verify", action="store_true",
+                        help="re-read every copy (including moves to another drive) and compare "
+                             "it with the source before the source is deleted")
+    parser.add_argument("--shard", type=shard_spec, default=None, metavar="MODE[:ARG]",
+                        help="spread each category over subfolders: date[:FORMAT] by modification "
+                             "time (default %%Y/%%m), hash[:N] by name hash, count[:N] at most N "
+                             "entries per folder, or off (default: the config's _shard setting, "
+                             "else off)")
+    parser.add_argument("--plan-out", type=Path, default=None, metavar="FILE",
+                        help="save the planned moves to FILE (JSON Lines, or CSV for a .csv name); "
+                             "usually combined with --preview")
+    parser.add_argument("--apply-plan", type=Path, default=None, metavar="FILE",
+                        help="carry out a saved plan without walking the folder again; sources "
+                             "that changed since are left alone (FOLDER is required for CSV plans)")
+    parser.add_argument("--metrics-json", type=Path, default=None, metavar="FILE",
+                        help="write per-phase timings and counters of the run to FILE as JSON")
+    parser.add_argument("--metrics-textfile", type=Path, default=None, metavar="FILE",
+                        help="write the run metrics to FILE in Prometheus text format "
+                             "(for node_exporter's textfile collector)")
+    parser.add_argument("--config", type=Path, default=None,
+                        help="path to folders_config.json (default: %(default)s)")
+    parser.add_argument("--json", action="store_true",
+                        help="print a JSON summary to stdout (log lines go to stderr)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print log lines")
+    return parser
+
+
+def shard_spec(text):
+    try:
+        ShardLayout.parse(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return text
+
+
+def options_from_args(args, config_path, settings=None):
+    state_path = args.state
+    if state_path is None and (args.incremental or args.full_rescan):
+        state_path = default_state_path(config_path)
+    journal_dir = None if args.no_journal else journal_dir_from_args(args)
+    return OrganizeOptions(
+        recursive=args.recursive,
+        include_hidden=args.hidden,
+        preview=args.preview,
+        create_folders=args.create_folders,
+        workers=args.workers,
+        per_device_workers=args.per_device,
+        state_path=state_path,
+        full_rescan=args.full_rescan,
+        journal_dir=journal_dir,
+        sniff=args.sniff,
+        sniff_cache_path=(args.state or default_state_path(config_path)) if args.sniff != "off" else None,
+        dedup=args.dedup,
+        record_plan=args.plan_out is not None,
+        transfer=args.transfer,
+        verify=args.verify,
+        pipeline=args.pipeline,
+        io_concurrency=args.io_concurrency,
+        shard=args.shard if args.shard is not None else (settings or {}).get("_shard", "off"),
+    )
+
+
+def journal_dir_from_args(args):
+    return args.journal_dir or default_journal_dir()
+
+
+def run_journal_command(args, reporter):
+    journal_dir = journal_dir_from_args(args)
+    name = args.undo or args.resume
+    path = latest_journal(journal_dir) if name == "latest" else Path(name)
+    if path is None or not path.is_file():
+        reporter.log(f"Error: no journal found ({path or journal_dir})")
+        return {"error": "no journal found"}
+    replay = undo_journal if args.undo else resume_journal
+    return replay(path, args.workers, args.per_device, reporter)
+
+
+def run_batch(args, config_path, folders, settings, reporter):
+    try:
+        jobs, batch_settings = load_batch(args.batch)
+    except (OSError, ValueError) as e:
+        reporter.log(f"Error: cannot read batch file {args.batch}: {str(e)}")
+        return {"batch": True, "error": str(e)}
+    # Settings the batch file leaves out come from -j and --per-device.
+    runner = BatchRunner(folders, settings, options_from_args(args, config_path, settings), jobs,
+                         reporter, RunControl(), **batch_settings)
+    cancel_on_signals(runner.control, reporter)
+    return runner.run()
+
+
+def run_watch(organizer, folder, args):
+    from .watch import FolderWatcher
+
+    if not folder.is_dir():
+        organizer.reporter.log("Error: Selected folder does not exist!")
+        return 2
+    watcher = FolderWatcher(organizer, folder, settle=args.settle,
+                            poll_interval=args.poll or 5.0, use_inotify=args.poll is None)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        organizer.reporter.log("Stopped watching.")
+    return 0
+
+
+def cancel_on_signals(control, reporter):
+    """First Ctrl+C (or SIGTERM) stops the run after the current chunk; a second one aborts."""
+    def handle(signum, frame):
+        if control.cancelled:
+            raise KeyboardInterrupt
+        reporter.log("Cancelling after the current chunk (press Ctrl+C again to stop at once)...")
+        control.cancel()
+
+    signal.signal(signal.SIGINT, handle)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, handle)
+
+
+def run_gui():
+    # Imported lazily so headless runs never pay for tkinter.
+    from file_organizer_v2 import main as gui_main
+    gui_main()
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.batch and (args.folder or args.undo or args.resume or args.apply_plan
+                       or args.plan_out or args.watch):
+        parser.error("--batch cannot be combined with a folder, --watch, --undo, --resume, "
+                     "--apply-plan or --plan-out")
+    if args.folder is None and not (args.undo or args.resume or args.apply_plan or args.batch):
+        return run_gui()
+
+    config_path = args.config or default_config_path()
+    folders, settings = load_config(config_path)
+
+    if args.quiet:
+        reporter = Reporter()
+    else:
+        reporter = StreamReporter(sys.stderr if args.json else sys.stdout)
+
+    if args.undo or args.resume:
+        summary = run_journal_command(args, reporter)
+        return finish(summary, args)
+
+    if args.batch:
+        summary = run_batch(args, config_path, folders, settings, reporter)
+        export_metrics(summary, args, reporter)
+        return finish(summary, args)
+
+    classifier = ExtensionClassifier(folders, settings.get("_rules"))
+    organizer = FileOrganizer(folders, options_from_args(args, config_path, settings), reporter,
+                              classifier)
+    if args.watch:
+        return run_watch(organizer, Path(args.folder).expanduser(), args)
+    organizer.control = RunControl()
+    cancel_on_signals(organizer.control, reporter)
+    try:
+        if args.apply_plan:
+            folder = None if args.folder is None else str(Path(args.folder).expanduser())
+            plan = MovePlan.load(args.apply_plan, folder)
+            summary = organizer.run(plan.root, plan=plan)
+        else:
+            summary = organizer.run(Path(args.folder).expanduser())
+        if args.plan_out and organizer.plan is not None:
+            organizer.plan.save(args.plan_out)
+            reporter.log(f"Saved a plan of {len(organizer.plan)} moves to {args.plan_out}")
+    except Exception as e:
+        reporter.log(f"Error: {str(e)}")
+        summary = {"folder": args.folder, "error": str(e)}
+
+    export_metrics(summary, args, reporter)
+    return finish(summary, args)
+
+
+def export_metrics(summary, args, reporter):
+    if summary.get("batch"):
+        # One file for the whole batch, with a root per folder.
+        runs = [(root["metrics"], root["folder"]) for root in summary.get("roots", ())
+                if "metrics" in root]
+        if not runs:
+            return
+        exports = ((args.metrics_json, lambda path: write_batch_json(path, runs)),
+                   (args.metrics_textfile, lambda path: write_batch_textfile(path, runs)))
+    else:
+        metrics = summary.get("metrics")
+        if metrics is None:
+            return
+        folder = summary["folder"]
+        exports = ((args.metrics_json, lambda path: write_json(path, metrics, folder)),
+                   (args.metrics_textfile, lambda path: write_textfile(path, metrics, folder)))
+    for path, write in exports:
+        if path is None:
+            continue
+        try:
+            write(path)
+        except OSError as e:
+            reporter.log(f"Error writing metrics to {path}: {str(e)}")
+
+
+def finish(summary, args):
+    """Print the JSON summary if asked for and turn the summary into an exit code."""
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+    if "error" in summary:
+        return 2
+    failed = summary.get("errors") or summary.get("failed_roots") or summary.get("cancelled")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
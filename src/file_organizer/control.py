@@ -0,0 +1,39 @@
+import threading
+
+
+class RunControl:
+    """Lets another thread pause, resume or cancel a running organize job.
+
+    The engine checks it between chunks of files, so a pause or cancel
+    takes effect after the current chunk and never in the middle of a move.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def pause(self):
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # Wake a paused job so it can notice.
+        self._running.set()
+
+    def wait_while_paused(self):
+        """Block until resumed or cancelled; returns False when cancelled."""
+        self._running.wait()
+        return not self.cancelled
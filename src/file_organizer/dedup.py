@@ -0,0 +1,149 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# "skip" leaves duplicates where they are, "hardlink" replaces them with a
+# hard link to the original, "move" puts them in the duplicates folder.
+DEDUP_MODES = ("off", "skip", "hardlink", "move")
+
+# Bytes hashed from each end of a file before deciding it needs a full hash.
+BLOCK_SIZE = 64 * 1024
+_READ_SIZE = 1024 * 1024
+
+
+def partial_hash(path, size):
+    """Hash of the first and last ``BLOCK_SIZE`` bytes (the whole file when small); None if unreadable."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            digest.update(f.read(BLOCK_SIZE))
+            if size > BLOCK_SIZE:
+                f.seek(max(BLOCK_SIZE, size - BLOCK_SIZE))
+                digest.update(f.read(BLOCK_SIZE))
+    except OSError:
+        return None
+    return digest.digest()
+
+
+def full_hash(path):
+    """SHA-256 of the whole file, or None if it cannot be read. Runs in worker processes."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_READ_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.digest()
+
+
+def link_duplicate(original, src, target):
+    """Replace ``src`` by a hard link to ``original`` placed at ``target``."""
+    os.link(original, target)
+    os.unlink(src)
+
+
+def link_copy(original, src, target):
+    """Place a hard link to ``original`` at ``target``; ``src`` stays where it is."""
+    os.link(original, target)
+
+
+class DuplicateFinder:
+    """Finds byte-identical copies among the files of a run and the files already organized.
+
+    Work is narrowed down in stages so most files are never read: files are
+    bucketed by size, files sharing a size are compared by a hash of their
+    first and last blocks, and only those still colliding are hashed in
+    full, on a process pool so large files are spread across cores. Empty
+    files are never considered duplicates.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.partial_hashes = 0
+        self.full_hashes = 0
+
+    def find(self, candidates, dest_dirs):
+        """Map candidate indexes to the file they duplicate.
+
+        ``candidates`` are ``(path, size, final_path)`` tuples in plan order,
+        ``final_path`` being where the file will end up. Files already in
+        ``dest_dirs`` are preferred as originals; otherwise the first
+        candidate of a group is kept and the others map to its final path.
+        """
+        by_size = {}
+        for index, (path, size, final_path) in enumerate(candidates):
+            if size:
+                by_size.setdefault(size, []).append((index, path, final_path))
+        if not by_size:
+            return {}
+
+        existing = {}
+        for dest_dir in dest_dirs:
+            try:
+                listing = os.scandir(dest_dir)
+            except OSError:
+                continue
+            with listing:
+                for entry in listing:
+                    try:
+                        if not entry.is_file(follow_symlinks=False):
+                            continue
+                        size = entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+                    if size in by_size:
+                        existing.setdefault(size, []).append((None, entry.path, entry.path))
+
+        partial_groups = []
+        for size, members in by_size.items():
+            members = existing.get(size, []) + members
+            if len(members) < 2:
+                continue
+            buckets = {}
+            for member in members:
+                digest = partial_hash(member[1], size)
+                self.partial_hashes += 1
+                if digest is not None:
+                    buckets.setdefault(digest, []).append(member)
+            partial_groups.extend((size, group) for group in buckets.values() if len(group) > 1)
+
+        groups = []
+        to_hash = []
+        for size, group in partial_groups:
+            if size <= 2 * BLOCK_SIZE:
+                # The partial hash already covered every byte.
+                groups.append(group)
+            else:
+                to_hash.append(group)
+        if to_hash:
+            paths = [member[1] for group in to_hash for member in group]
+            digests = iter(self._full_hashes(paths))
+            for group in to_hash:
+                buckets = {}
+                for member in group:
+                    digest = next(digests)
+                    if digest is not None:
+                        buckets.setdefault(digest, []).append(member)
+                groups.extend(g for g in buckets.values() if len(g) > 1)
+
+        duplicates = {}
+        for group in groups:
+            original = group[0][2]
+            for index, _path, _final_path in group[1:]:
+                if index is not None:
+                    duplicates[index] = original
+        return duplicates
+
+    def _full_hashes(self, paths):
+        self.full_hashes += len(paths)
+        workers = min(self.workers, len(paths))
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(workers) as pool:
+                    return list(pool.map(full_hash, paths,
+                                         chunksize=max(1, len(paths) // (workers * 4))))
+            except (OSError, RuntimeError, NotImplementedError):
+                # No usable process pool here (sandbox, broken worker); hash inline.
+                pass
+        return [full_hash(path) for path in paths]
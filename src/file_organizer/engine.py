@@ -0,0 +1,916 @@
+import os
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+from .executor import MoveExecutor
+from .metrics import RunMetrics
+from .rules import RuleMatcher
+from .transfer import Transfer
+
+DEFAULT_FOLDERS = {
+    "images": ["jpg", "jpeg", "png", "gif", "bmp", "tiff", "webp"],
+    "documents": ["txt", "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx"],
+    "archives": ["zip", "rar", "tar", "gz", "7z"],
+    "audio": ["mp3", "wav", "flac", "aac", "ogg"],
+    "video": ["mp4", "avi", "mkv", "mov", "wmv"],
+    "code": ["py", "js", "html", "css", "java", "cpp", "c", "php"],
+    "executables": ["exe", "msi", "app", "bat"]
+}
+
+OTHERS_FOLDER = "others"
+DUPLICATES_FOLDER = "duplicates"
+
+# Files handled between checks for pause/cancel, and the minimum time between
+# checkpoints (in-flight moves drained, journal and scan state made durable).
+CHUNK_FILES = 256
+CHECKPOINT_SECONDS = 30.0
+# Filesystem calls kept in flight by the "async" pipeline (see aio.AsyncWalker).
+IO_CONCURRENCY = 32
+
+
+def default_config_path():
+    """Where folders_config.json lives: next to the module, or in the user config dir when frozen."""
+    if getattr(sys, "frozen", False):
+        appdata = os.getenv("APPDATA")
+        if appdata:
+            base = Path(appdata) / "FileOrganizer"
+        else:
+            base = Path.home() / ".config" / "FileOrganizer"
+        base.mkdir(parents=True, exist_ok=True)
+        return base / "folders_config.json"
+    return Path(__file__).resolve().parent.parent / "folders_config.json"
+
+
+def normalize_extensions(extensions):
+    cleaned = []
+    seen = set()
+    for ext in extensions:
+        if not isinstance(ext, str):
+            continue
+        norm = ext.strip().lstrip('.').lower()
+        if not norm or norm in seen:
+            continue
+        seen.add(norm)
+        cleaned.append(norm)
+    return cleaned
+
+
+def load_config(config_path, defaults=None):
+    """Read a folders config file.
+
+    Returns ``(folders, settings)``: the category mapping and the
+    underscore-prefixed settings (``_theme`` and friends). Falls back to
+    ``defaults`` (or DEFAULT_FOLDERS) on any problem reading the file.
+    """
+    if defaults is None:
+        defaults = DEFAULT_FOLDERS
+    config_path = Path(config_path)
+    settings = {}
+    if config_path.exists():
+        try:
+            with config_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                cleaned = {}
+                for name, value in data.items():
+                    if not isinstance(name, str):
+                        continue
+                    if name.startswith("_"):
+                        settings[name] = value
+                        continue
+                    if not isinstance(value, list):
+                        continue
+                    cleaned[name] = normalize_extensions(value)
+                if cleaned:
+                    return cleaned, settings
+        except Exception:
+            # Fall back to defaults on any load issue
+            pass
+    return dict(defaults), settings
+
+
+def save_config(config_path, folders, settings=None):
+    payload: dict = {name: sorted(exts) for name, exts in folders.items()}
+    if settings:
+        payload.update(settings)
+    with Path(config_path).open("w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+
+
+def iter_files(base_folder, recursive=False, include_hidden=False, skip_roots=(), state=None):
+    """Walk ``base_folder`` with ``os.scandir`` and yield a DirEntry per file.
+
+    Directories are pushed on a stack and listed one at a time, so only one
+    directory handle is open and files are handed out while the walk is
+    still going. ``skip_roots`` names top-level folders that are never
+    entered, and hidden directories are pruned along with hidden files
+    unless ``include_hidden`` is set. Directory symlinks are not followed.
+
+    With a ``state`` (see ``state.RootState``) directories whose mtime is
+    unchanged since the last run are not listed again; the walk just
+    continues into their known subdirectories.
+    """
+    stack = [(os.fspath(base_folder), "", True)]
+    while stack:
+        path, rel, at_root = stack.pop()
+        known = None
+        if state is not None:
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                state.invalidate(rel)
+                continue
+            unchanged = state.unchanged_subdirs(rel, mtime_ns)
+            if unchanged is not None:
+                if at_root:
+                    unchanged = [name for name in unchanged if name not in skip_roots]
+                if recursive:
+                    stack.extend((os.path.join(path, name), os.path.join(rel, name), False)
+                                 for name in reversed(unchanged))
+                continue
+            known = state.known_entries(rel)
+        subdirs = []
+        for entry in scan_dir(path, at_root, recursive, include_hidden, skip_roots, subdirs):
+            if known and left_unchanged(entry, known, state, rel):
+                continue
+            yield entry
+        if state is not None:
+            state.record_dir(rel, mtime_ns, subdirs)
+        # Reversed so directories are visited in listing order.
+        stack.extend((os.path.join(path, name), os.path.join(rel, name), False)
+                     for name in reversed(subdirs))
+
+
+def scan_dir(path, at_root, recursive, include_hidden, skip_roots, subdirs):
+    """One directory of ``iter_files``: yield its files, append the subfolders to enter to ``subdirs``."""
+    try:
+        listing = os.scandir(path)
+    except OSError:
+        return
+    with listing:
+        for entry in listing:
+            name = entry.name
+            if not include_hidden and name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not (at_root and name in skip_roots):
+                        subdirs.append(name)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            yield entry
+
+
+def left_unchanged(entry, known, state, rel):
+    """True for a file left in place by an earlier run and unchanged since; it is recorded again."""
+    signature = known.get(entry.name)
+    if signature is None:
+        return False
+    try:
+        st = entry.stat()
+    except OSError:
+        return True
+    if signature != (st.st_size, st.st_mtime_ns):
+        return False
+    state.record_entry(rel, entry.name, st.st_size, st.st_mtime_ns)
+    return True
+
+
+class ExtensionClassifier:
+    """Name -> category classifier compiled once from a folders mapping and ``_rules``.
+
+    When two categories list the same extension the first one (in mapping
+    order) keeps it, as before; the others are recorded in ``conflicts``.
+    The ordered ``rules`` (see ``rules.RuleMatcher``) take precedence over
+    the mapping, and multi-part extensions such as ``tar.gz`` match before
+    their last part.
+    """
+
+    def __init__(self, folders, rules=None):
+        self.categories = list(folders.keys())
+        self.index = {}
+        self.conflicts = {}
+        for name, exts in folders.items():
+            for ext in exts:
+                owner = self.index.get(ext)
+                if owner is None:
+                    self.index[ext] = name
+                elif owner != name:
+                    self.conflicts.setdefault(ext, [owner]).append(name)
+        self.matcher = RuleMatcher(self.index, rules)
+        for category in self.matcher.categories:
+            if category not in self.categories:
+                self.categories.append(category)
+
+    def match(self, name, entry=None):
+        """``(category, matched)`` for a file name; ``entry`` is stat'ed only by size/age rules."""
+        category, matched = self.matcher.match(name, entry)
+        return (category, True) if matched else (OTHERS_FOLDER, False)
+
+    def fingerprint(self):
+        """Stable digest of the mapping and rules; cached scan state is dropped when they change."""
+        payload = json.dumps([sorted(self.categories), sorted(self.index.items())])
+        if self.matcher.rules:
+            payload += self.matcher.fingerprint_data()
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def conflict_messages(self):
+        return [
+            f"Warning: extension '.{ext}' is claimed by {', '.join(owners)}; using '{owners[0]}'."
+            for ext, owners in sorted(self.conflicts.items())
+        ] + self.matcher.errors
+
+
+class FileEntry:
+    """Minimal stand-in for ``os.DirEntry`` for files that did not come from a directory walk."""
+
+    __slots__ = ("path", "name")
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        self.name = os.path.basename(self.path)
+
+    def stat(self, follow_symlinks=True):
+        return os.stat(self.path) if follow_symlinks else os.lstat(self.path)
+
+    def __repr__(self):
+        return f"<FileEntry {self.path!r}>"
+
+
+class DestinationIndex:
+    """Names already taken in each destination folder during one run.
+
+    Each folder is listed once with ``os.scandir`` the first time a file is
+    planned into it; after that every reservation (preview or real) is
+    recorded here, and the next free ``name (N)`` counter is remembered per
+    stem, so collisions are resolved without probing the disk per candidate.
+    """
+
+    def __init__(self):
+        self._names = {}
+        self._counters = {}
+
+    def _names_in(self, dest_dir):
+        key = os.fspath(dest_dir)
+        names = self._names.get(key)
+        if names is None:
+            names = set()
+            try:
+                with os.scandir(key) as listing:
+                    for entry in listing:
+                        names.add(os.path.normcase(entry.name))
+            except OSError:
+                pass
+            self._names[key] = names
+        return names
+
+    def reserve(self, dest_dir: Path, original_name: str) -> Path:
+        """Claim a free name in ``dest_dir`` for ``original_name`` and return its path."""
+        names = self._names_in(dest_dir)
+        key = os.path.normcase(original_name)
+        if key not in names:
+            names.add(key)
+            return dest_dir / original_name
+        stem, suffix = os.path.splitext(original_name)
+        counter_key = (os.fspath(dest_dir), os.path.normcase(stem), os.path.normcase(suffix))
+        counter = self._counters.get(counter_key, 1)
+        while True:
+            candidate = f"{stem} ({counter}){suffix}"
+            counter += 1
+            key = os.path.normcase(candidate)
+            if key not in names:
+                names.add(key)
+                self._counters[counter_key] = counter
+                return dest_dir / candidate
+
+    def taken(self, dest_dir, name):
+        """True when ``name`` is already used in ``dest_dir``."""
+        return os.path.normcase(name) in self._names_in(dest_dir)
+
+    def preload(self, dest_dir, names):
+        """Take the names of ``dest_dir`` from a listing made elsewhere (see ``aio.list_folders``)."""
+        self._names[os.fspath(dest_dir)] = {os.path.normcase(name) for name in names}
+
+    def release(self, path: Path):
+        """Give back a reserved name, e.g. when the move into it failed."""
+        names = self._names.get(os.fspath(path.parent))
+        if names is not None:
+            names.discard(os.path.normcase(path.name))
+
+
+class OrganizeOptions:
+    """Plain options for a single organize run (what the GUI checkboxes map to)."""
+
+    def __init__(self, recursive=False, include_hidden=False, preview=False, create_folders=True,
+                 workers=1, per_device_workers=0, state_path=None, full_rescan=False,
+                 journal_dir=None, sniff="off", sniff_cache_path=None, dedup="off",
+                 record_plan=False, shard="off", pipeline="sync", io_concurrency=IO_CONCURRENCY,
+                 transfer="move", verify=False):
+        self.recursive = recursive
+        self.include_hidden = include_hidden
+        self.preview = preview
+        self.create_folders = create_folders
+        # Parallel renames: thread count, and how many may hit one device at once (0 = no extra limit).
+        self.workers = workers
+        self.per_device_workers = per_device_workers
+        # Incremental rescans: SQLite scan state file (None = always walk everything).
+        self.state_path = state_path
+        self.full_rescan = full_rescan
+        # Folder for move journals (undo/resume); None = no journal.
+        self.journal_dir = journal_dir
+        # Content sniffing: "off", "unknown" (files without a known extension) or
+        # "all" (also overrides extensions that contradict a strong signature).
+        self.sniff = sniff
+        self.sniff_cache_path = sniff_cache_path
+        # Duplicate handling: "off", "skip", "hardlink" or "move" (to the duplicates folder).
+        self.dedup = dedup
+        # Keep the planned moves as a MovePlan (``FileOrganizer.plan``) to save or apply later.
+        self.record_plan = record_plan
+        # Destination sharding inside category folders, e.g. "date:%Y/%m" (see shard.ShardLayout).
+        self.shard = shard
+        # "async" keeps up to io_concurrency listings, stats and renames in flight,
+        # for network mounts where every call waits on the server.
+        self.pipeline = pipeline
+        self.io_concurrency = io_concurrency
+        # How files get to their folder: "move", "copy", "hardlink", "symlink" or
+        # "reflink" (see transfer.Transfer); verify re-reads every copy.
+        self.transfer = transfer
+        self.verify = verify
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class Reporter:
+    """Receives log lines, status text and progress from a run. Discards everything by default."""
+
+    def log(self, message):
+        pass
+
+    def status(self, message):
+        pass
+
+    def progress(self, processed, total):
+        """``total`` is None while the walk is still discovering files."""
+        pass
+
+
+class FileOrganizer:
+    """Headless organizer: sorts the files of a folder into category subfolders."""
+
+    def __init__(self, folders, options=None, reporter=None, classifier=None, control=None,
+                 pool=None):
+        self.folders = folders
+        self.options = options or OrganizeOptions()
+        self.reporter = reporter or Reporter()
+        # Optional RunControl for pausing or cancelling from another thread.
+        self.control = control
+        # Optional executor.WorkerPool shared with other runs; replaces the
+        # run's own worker threads and per-device limits.
+        self.pool = pool
+        # Optional journal.MoveJournal shared by several runs (a watch session);
+        # each run syncs it but leaves it open for the owner to close.
+        self.journal = None
+        self.classifier = classifier or ExtensionClassifier(folders)
+        self.destinations = DestinationIndex()
+        self.sniffer = None
+        self._sniffed = 0
+        self.metrics = RunMetrics()
+        self.plan = None
+
+    def unique_destination(self, dest_dir: Path, original_name: str) -> Path:
+        return self.destinations.reserve(dest_dir, original_name)
+
+    def skip_roots(self):
+        """Top-level folder names the recursive walk never enters."""
+        roots = set(self.folders.keys()) | set(self.classifier.categories)
+        return roots | {OTHERS_FOLDER, DUPLICATES_FOLDER}
+
+    def iter_files(self, base_folder, state=None):
+        """Yield ``os.DirEntry`` objects for the files to organize as they are found."""
+        options = self.options
+        if options.pipeline == "async":
+            from .aio import AsyncWalker
+            return iter(AsyncWalker(base_folder, options.recursive, options.include_hidden,
+                                    self.skip_roots(), state, options.io_concurrency))
+        return iter_files(base_folder, self.options.recursive, self.options.include_hidden,
+                          self.skip_roots(), state)
+
+    def state_fingerprint(self):
+        """What cached scan state depends on: the mapping, the walk options and what counts as kept.
+
+        Copy and link modes, and dedup, record sources as left in place; a
+        run in another mode must look at them again.
+        """
+        options = self.options
+        return "|".join([self.classifier.fingerprint(), str(options.recursive),
+                         str(options.include_hidden), str(options.create_folders),
+                         options.transfer, options.dedup])
+
+    def category_for_entry(self, entry):
+        """Category by rules and extension, corrected by the file's first bytes when sniffing is on."""
+        category, known = self.classifier.match(entry.name, entry)
+        sniffer = self.sniffer
+        if sniffer is None:
+            return category
+        if known and self.options.sniff != "all":
+            return category
+        sniffed, strong = sniffer.sniff(entry)
+        if not sniffed or sniffed == category or sniffed not in self.classifier.categories:
+            return category
+        if strong or not known:
+            self._sniffed += 1
+            return sniffed
+        return category
+
+    def destination_ready(self, dest_dir: Path, create=None) -> bool:
+        """Create ``dest_dir`` if allowed, once per run, and report whether it exists.
+
+        ``create`` overrides the create_folders option, e.g. for shard folders
+        inside a category folder that already exists.
+        """
+        ready = self._ready_dirs.get(dest_dir)
+        if ready is None:
+            if self.options.create_folders if create is None else create:
+                try:
+                    dest_dir.mkdir()
+                    self.metrics.counters["mkdirs"] += 1
+                except OSError:
+                    pass
+            ready = self._ready_dirs[dest_dir] = dest_dir.is_dir()
+        return ready
+
+    def split_shard(self, category_dir, dest_dir):
+        """``(category_dir, shard folder names)`` for a target folder inside ``category_dir``.
+
+        Other target folders come back as ``(dest_dir, ())``.
+        """
+        rel = os.path.relpath(str(dest_dir), str(category_dir))
+        if rel == os.curdir or rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            return dest_dir, ()
+        return category_dir, tuple(rel.split(os.sep))
+
+    def run(self, base_folder, entries=None, plan=None):
+        """Organize ``base_folder`` and return a summary dict of what happened.
+
+        ``entries`` (DirEntry or FileEntry objects under ``base_folder``)
+        replaces the directory walk, e.g. for files reported by a watcher.
+        A ``plan`` (see ``plan.MovePlan``) is applied as it is, without a
+        walk or classification; sources whose size or mtime changed since
+        the plan was made are left alone.
+
+        Files are handled in chunks of ``CHUNK_FILES``. Between chunks the
+        run honours pause and cancel requests from ``self.control`` and, at
+        most every ``CHECKPOINT_SECONDS``, waits for in-flight moves and
+        commits the journal and the scan state, so an interrupted run loses
+        at most the last chunks and a restart does not start from scratch.
+        """
+        log = self.reporter.log
+        options = self.options
+        metrics = self.metrics = RunMetrics()
+        phases = metrics.phases
+        clock = time.perf_counter
+        run_started = clock()
+        base_folder = Path(base_folder)
+        mode = "recursive" if options.recursive else "top-level only"
+        summary = {
+            "folder": str(base_folder),
+            "mode": mode,
+            "preview": options.preview,
+            "found": 0,
+            "processed": 0,
+            "moved": 0,
+            "errors": 0,
+            "skipped": 0,
+            "categories": {},
+        }
+
+        if not base_folder.exists():
+            log("Error: Selected folder does not exist!")
+            self.reporter.status("Error occurred")
+            summary["error"] = "folder does not exist"
+            return summary
+
+        if plan is not None:
+            entries = plan.entries()
+            summary["mode"] = "plan"
+            summary["changed"] = 0
+            log(f"Applying a plan of {len(plan)} moves to: {base_folder}")
+        elif entries is None:
+            log(f"Starting organization of: {base_folder} ({mode})")
+            for message in self.classifier.conflict_messages():
+                log(message)
+        else:
+            entries = list(entries)
+            log(f"Organizing {len(entries)} new files in: {base_folder}")
+        shard = None
+        if plan is None and options.shard not in (None, "", "off"):
+            from .shard import ShardLayout
+            try:
+                shard = ShardLayout.parse(options.shard)
+            except ValueError as e:
+                log(f"Error: {e}")
+                self.reporter.status("Error occurred")
+                summary["error"] = str(e)
+                return summary
+        self.destinations = DestinationIndex()
+        self._ready_dirs = {}
+        self._sniffed = 0
+        if options.pipeline == "async" and plan is None:
+            # List the existing category folders all at once instead of one
+            # round trip each when the first file is planned into them.
+            from .aio import list_folders
+            started = clock()
+            names = [*self.classifier.categories, OTHERS_FOLDER, DUPLICATES_FOLDER]
+            listed = list_folders([base_folder / name for name in names], options.io_concurrency)
+            for dest_dir, found in listed.items():
+                self._ready_dirs[dest_dir] = True
+                self.destinations.preload(dest_dir, found)
+            phases["collisions"] += clock() - started
+        if options.sniff in ("unknown", "all"):
+            from .sniff import ContentSniffer
+            self.sniffer = ContentSniffer(options.sniff_cache_path)
+
+        state_store = root_state = None
+        if entries is None and plan is None and options.state_path and not (options.preview and options.full_rescan):
+            from .state import ScanState
+            state_store = ScanState(options.state_path)
+            root_state = state_store.open_root(base_folder, self.state_fingerprint(),
+                                               options.full_rescan, readonly=options.preview)
+
+        executor = journal = None
+        if not options.preview:
+            workers = options.workers
+            if options.pipeline == "async" and workers <= 1:
+                workers = options.io_concurrency
+            executor = MoveExecutor(workers, options.per_device_workers, self.pool)
+            journal = self.journal
+            if journal is not None:
+                summary["journal"] = str(journal.path)
+            elif options.journal_dir:
+                from .journal import open_journal
+                journal = open_journal(options.journal_dir, base_folder, log)
+                if journal is not None:
+                    summary["journal"] = str(journal.path)
+        # Moves whose plan records are not synced to the journal yet.
+        unsynced_moves = []
+        # With dedup on, planned moves are held back until the walk is done.
+        held = None
+        if options.dedup != "off" and plan is None:
+            held = []
+            summary["duplicates"] = 0
+            summary["duplicate_bytes"] = 0
+        recording = None
+        if options.record_plan:
+            from .plan import MovePlan
+            recording = self.plan = MovePlan(str(base_folder))
+        base_prefix = os.path.join(str(base_folder), "")
+        categories = summary["categories"]
+
+        def file_done():
+            summary["processed"] += 1
+            processed = summary["processed"]
+            # The walk streams, so the total is unknown until it finishes.
+            self.reporter.progress(processed, None)
+            self.reporter.status(f"Processing... {processed} files")
+
+        def move_done(context, error):
+            src_label, target_path, folder, move_id, verb, size, device = context
+            if journal is not None:
+                if error is None:
+                    journal.done(move_id)
+                else:
+                    journal.fail(move_id, error)
+            if error is None:
+                log(f"{verb}: {src_label} → {target_path.relative_to(base_folder)}")
+                summary["moved"] += 1
+                categories[folder] = categories.get(folder, 0) + 1
+                metrics.moved(folder, device, size)
+            else:
+                # A FileExistsError means another file took the name meanwhile; it stays taken.
+                if not isinstance(error, FileExistsError):
+                    self.destinations.release(target_path)
+                log(f"Error moving {src_label}: {str(error)}")
+                summary["errors"] += 1
+                metrics.counters["errors"] += 1
+                if root_state is not None:
+                    root_state.invalidate(os.path.dirname(src_label))
+            file_done()
+
+        def submit_moves():
+            # Plan records must be durable before the renames they describe start.
+            if journal is not None:
+                started = clock()
+                journal.sync()
+                phases["journal"] += clock() - started
+            for device, fn, args, context in unsynced_moves:
+                for done_context, error in executor.submit(device, fn, *args, context=context):
+                    move_done(done_context, error)
+            del unsynced_moves[:]
+
+        def leave_in_place(entry, src_label):
+            if root_state is not None:
+                try:
+                    st = entry.stat()
+                    root_state.record_entry(os.path.dirname(src_label), entry.name,
+                                            st.st_size, st.st_mtime_ns)
+                except OSError:
+                    pass
+            file_done()
+
+        def skip(entry, src_label):
+            # Not a deliberate keep: the next incremental run must list its folder again.
+            summary["skipped"] += 1
+            if root_state is not None:
+                root_state.invalidate(os.path.dirname(src_label))
+            file_done()
+
+        def copy_progress(src, copied, total):
+            # Called on worker threads; reporters hand status over thread-safely.
+            self.reporter.status(f"Copying {os.path.basename(src)}: {copied * 100 // total}%")
+
+        transfer = Transfer(options.transfer, options.verify, copy_progress)
+        # Duplicates are hard-linked to their original; the source goes away
+        # unless the transfer mode keeps sources.
+        link_fn = link_mode = None
+        if options.dedup == "hardlink" or plan is not None:
+            from .dedup import link_copy, link_duplicate
+            link_fn, link_mode = ((link_copy, "hardlink") if transfer.keeps_source
+                                  else (link_duplicate, "move"))
+
+        def place(entry, src_label, folder, target_path, fn=None, args=None, verb=None,
+                  note="", link=None, mode=None):
+            started = clock()
+            try:
+                st = entry.stat(follow_symlinks=False)
+                size, device = st.st_size, st.st_dev
+                if recording is not None:
+                    recording.add(entry.path, folder, target_path, size, st.st_mtime_ns, link)
+            except OSError:
+                st = None
+                size, device = 0, None
+            metrics.counters["stats"] += 1
+            metrics.note_volume(device, entry.path)
+            phases["stat"] += clock() - started
+            if options.preview:
+                log(f"[PREVIEW] {src_label} → {target_path.relative_to(base_folder)}{note}")
+                categories[folder] = categories.get(folder, 0) + 1
+                metrics.planned(folder, device, size)
+                file_done()
+                return
+            if mode is None:
+                mode = "move" if fn is not None else transfer.mode
+            move_id = None if journal is None else journal.plan(entry.path, target_path, mode)
+            if transfer.keeps_source and root_state is not None and st is not None:
+                # The source stays; the next incremental run need not look at it again.
+                root_state.record_entry(os.path.dirname(src_label), entry.name, size, st.st_mtime_ns)
+            unsynced_moves.append((device, metrics.timed(fn or transfer, folder, device),
+                                   args or (entry.path, target_path),
+                                   (src_label, target_path, folder, move_id, verb or transfer.verb,
+                                    size, device)))
+            if journal is None or journal.due():
+                submit_moves()
+
+        def place_held():
+            from .dedup import DuplicateFinder
+
+            self.reporter.status("Looking for duplicates...")
+            started = clock()
+            candidates = []
+            for entry, _src_label, _folder, target_path in held:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    size = 0
+                candidates.append((entry.path, size, target_path))
+            finder = DuplicateFinder()
+            dest_dirs = sorted({target_path.parent for _e, _s, _f, target_path in held})
+            duplicates = finder.find(candidates, dest_dirs)
+            summary["partial_hashes"] = finder.partial_hashes
+            summary["full_hashes"] = finder.full_hashes
+            phases["dedup"] += clock() - started
+
+            for index, (entry, src_label, folder, target_path) in enumerate(held):
+                if index and index % CHUNK_FILES == 0 and not keep_going():
+                    return
+                if index not in duplicates:
+                    place(entry, src_label, folder, target_path)
+            # Originals must be in place before duplicates are linked to them.
+            drain_moves()
+
+            for count, (index, original) in enumerate(sorted(duplicates.items())):
+                if count and count % CHUNK_FILES == 0 and not keep_going():
+                    return
+                entry, src_label, folder, target_path = held[index]
+                summary["duplicates"] += 1
+                summary["duplicate_bytes"] += candidates[index][1]
+                original_label = os.path.relpath(original, str(base_folder))
+                if options.dedup == "hardlink":
+                    place(entry, src_label, folder, target_path, link_fn,
+                          (original, entry.path, target_path), "Linked",
+                          f" (hard link to {original_label})", link=original, mode=link_mode)
+                    continue
+                self.destinations.release(target_path)
+                note = f" (duplicate of {original_label})"
+                if options.dedup == "skip":
+                    prefix = "[PREVIEW] " if options.preview else ""
+                    log(f"{prefix}Duplicate left in place: {src_label}{note}")
+                    leave_in_place(entry, src_label)
+                    continue
+                dup_dir = base_folder / DUPLICATES_FOLDER
+                if not self.destination_ready(dup_dir):
+                    log(f"Destination folder doesn't exist: {dup_dir}")
+                    skip(entry, src_label)
+                    continue
+                place(entry, src_label, DUPLICATES_FOLDER,
+                      self.unique_destination(dup_dir, entry.name), note=note)
+
+            if duplicates:
+                megabytes = summary["duplicate_bytes"] / (1024 * 1024)
+                log(f"Found {len(duplicates)} duplicate files ({megabytes:.1f} MB).")
+
+        def drain_moves():
+            if executor is not None:
+                submit_moves()
+                for context, error in executor.drain():
+                    move_done(context, error)
+
+        control = self.control
+        last_checkpoint = clock()
+        cancelled = False
+
+        def checkpoint():
+            nonlocal last_checkpoint
+            drain_moves()
+            if journal is not None:
+                journal.sync()
+            # Held (dedup) files are not moved yet, so their folders are not done.
+            if root_state is not None and held is None and not options.preview:
+                root_state.commit()
+            metrics.counters["checkpoints"] += 1
+            last_checkpoint = clock()
+
+        def keep_going():
+            """Called between chunks; False once the run was cancelled."""
+            nonlocal cancelled
+            if control is not None and control.paused:
+                checkpoint()
+                log("Paused.")
+                self.reporter.status("Paused")
+                if control.wait_while_paused():
+                    log("Resumed.")
+            if control is not None and control.cancelled:
+                cancelled = True
+                return False
+            if clock() - last_checkpoint >= CHECKPOINT_SECONDS:
+                checkpoint()
+            return True
+
+        linking = False
+        completed = False
+        try:
+            if entries is None:
+                entries = self.iter_files(base_folder, root_state)
+            entries = iter(entries)
+            while True:
+                found = summary["found"]
+                if found % CHUNK_FILES == 0 and not keep_going():
+                    break
+                started = clock()
+                entry = next(entries, None)
+                walked = clock()
+                phases["walk"] += walked - started
+                if entry is None:
+                    break
+                summary["found"] += 1
+                metrics.counters["files"] += 1
+                src_label = entry.path[len(base_prefix):]
+                if plan is None:
+                    folder = self.category_for_entry(entry)
+                    dest_dir = base_folder / folder
+                    name = entry.name
+                    subfolders = () if shard is None else shard.subfolders(entry, dest_dir)
+                else:
+                    if not entry.unchanged():
+                        log(f"Changed since the plan was made, left in place: {src_label}")
+                        summary["changed"] += 1
+                        file_done()
+                        continue
+                    folder = entry.category
+                    dest_dir, name = os.path.split(entry.target)
+                    dest_dir, subfolders = self.split_shard(base_folder / folder, Path(dest_dir))
+                classified = clock()
+                phases["classify"] += classified - walked
+                ready = self.destination_ready(dest_dir)
+                for subfolder in subfolders:
+                    if not ready:
+                        break
+                    dest_dir = dest_dir / subfolder
+                    # A preview creates no shard folders; they would be made by the real run.
+                    if not options.preview:
+                        ready = self.destination_ready(dest_dir, create=True)
+                phases["mkdir"] += clock() - classified
+
+                if not ready:
+                    log(f"Destination folder doesn't exist: {dest_dir}")
+                    skip(entry, src_label)
+                    continue
+
+                started = clock()
+                if transfer.keeps_source and plan is None and self.destinations.taken(dest_dir, name):
+                    try:
+                        done_before = transfer.already_done(entry.stat(), entry.path, dest_dir / name)
+                    except OSError:
+                        done_before = False
+                    if done_before:
+                        # Copied or linked by an earlier run; another copy would only be "name (1)".
+                        phases["collisions"] += clock() - started
+                        summary["already_done"] = summary.get("already_done", 0) + 1
+                        leave_in_place(entry, src_label)
+                        continue
+                target_path = self.unique_destination(dest_dir, name)
+                phases["collisions"] += clock() - started
+                if held is not None:
+                    held.append((entry, src_label, folder, target_path))
+                    self.reporter.status(f"Scanning... {summary['found']} files")
+                    continue
+                if plan is None:
+                    place(entry, src_label, folder, target_path)
+                    continue
+                if str(target_path) != entry.target:
+                    log(f"Planned target is taken, using {target_path.name}: {src_label}")
+                if entry.link is None:
+                    place(entry, src_label, folder, target_path)
+                    continue
+                if not linking:
+                    # Originals must be in place before duplicates are linked to them.
+                    linking = True
+                    drain_moves()
+                place(entry, src_label, folder, target_path, link_fn,
+                      (entry.link, entry.path, target_path), "Linked", link=entry.link,
+                      mode=link_mode)
+            if held and not cancelled:
+                place_held()
+            completed = True
+        finally:
+            # Stops a walk that is still running in the background (async pipeline).
+            close_walk = getattr(entries, "close", None)
+            if close_walk is not None:
+                close_walk()
+            if executor is not None:
+                if completed:
+                    submit_moves()
+                for context, error in executor.finish():
+                    move_done(context, error)
+                if journal is not None and journal is self.journal:
+                    journal.sync()
+                elif journal is not None:
+                    journal.close(finished=completed and not cancelled)
+            if self.sniffer is not None:
+                summary["sniffed"] = self._sniffed
+                summary["header_reads"] = self.sniffer.reads
+                self.sniffer.close()
+                self.sniffer = None
+            if state_store is not None:
+                # Only a finished (or cleanly cancelled) real run may mark folders
+                # as done; a preview moved nothing, and held files were never moved.
+                if completed and not options.preview and not (cancelled and held is not None):
+                    root_state.commit()
+                state_store.close()
+
+        metrics.finish(clock() - run_started)
+        summary["metrics"] = metrics.to_dict()
+
+        if summary.get("already_done"):
+            log(f"Skipped {summary['already_done']} files already "
+                f"{transfer.verb.lower()} by an earlier run.")
+
+        if root_state is not None and root_state.skipped_dirs:
+            summary["unchanged_dirs"] = root_state.skipped_dirs
+            log(f"Skipped {root_state.skipped_dirs} unchanged folders (incremental scan).")
+
+        processed = summary["processed"]
+        self.reporter.progress(processed, processed)
+        if cancelled:
+            summary["cancelled"] = True
+            log(f"Organization cancelled after {processed} files.")
+            self.reporter.status("Cancelled")
+            return summary
+        if processed == 0:
+            log("No files to process.")
+            self.reporter.status("Ready")
+            return summary
+
+        if options.preview:
+            log("Preview complete. No files were moved.")
+            self.reporter.status("Preview complete")
+        else:
+            log(f"Organization complete! Processed {summary['processed']} files.")
+            self.reporter.status("Ready")
+        return summary
@@ -0,0 +1,180 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class MoveExecutor:
+    """Runs per-file operations (renames) in submit order, on a thread pool or on a WorkerPool.
+
+    With ``workers`` of 1 everything runs inline on the calling thread, which
+    is the classic one-file-at-a-time behaviour. With more workers the calls
+    go to a private ``WorkerPool``, which hands a call to a thread only once
+    fewer than ``per_device`` calls touch its ``st_dev``, so one slow volume
+    cannot hog every thread and a fast one is not throttled by it.
+
+    Outcomes are handed back to the caller in submit order through
+    ``submit`` and ``finish``, so logging, counters and progress stay on the
+    planning thread and per-file error handling works exactly as before.
+    With a shared ``pool`` the calls run on its threads, next to those of
+    other runs, and ``finish`` leaves the pool up.
+    """
+
+    def __init__(self, workers=1, per_device=None, pool=None):
+        if pool is not None:
+            # A shared WorkerPool replaces the executor's own threads and device limits.
+            workers, per_device = pool.workers, pool.per_device
+        self.workers = max(1, int(workers or 1))
+        self.per_device = max(1, int(per_device or self.workers))
+        self._own_pool = None
+        if pool is None and self.workers > 1:
+            pool = self._own_pool = WorkerPool(self.workers, self.per_device)
+        self._lane = None if pool is None else pool.lane()
+        # Enough queued work to keep every worker busy without buffering a whole tree.
+        self._max_pending = self.workers * 8
+        self._pending = deque()
+
+    @property
+    def parallel(self):
+        return self._lane is not None
+
+    def submit(self, device, fn, *args, context=None):
+        """Queue ``fn(*args)`` for ``device``; returns ``(context, error)`` for finished calls.
+
+        ``error`` is None on success. Blocks only when too much work is queued.
+        """
+        if self._lane is not None:
+            future = self._lane.submit(device, fn, args)
+        else:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+        self._pending.append((context, future))
+        return self._collect(block=len(self._pending) > self._max_pending)
+
+    def _collect(self, block):
+        done = []
+        while self._pending:
+            context, future = self._pending[0]
+            if not (block or future.done()):
+                break
+            self._pending.popleft()
+            done.append((context, future.exception()))
+            block = len(self._pending) > self._max_pending
+        return done
+
+    def drain(self):
+        """Wait for everything queued so far; returns the outcomes in order. The pool stays up."""
+        done = []
+        while self._pending:
+            context, future = self._pending.popleft()
+            done.append((context, future.exception()))
+        return done
+
+    def finish(self):
+        """Wait for everything still queued; returns the remaining outcomes in order."""
+        done = self.drain()
+        if self._own_pool is not None:
+            self._own_pool.shutdown()
+            self._own_pool = None
+        return done
+
+
+class WorkerPool:
+    """Worker threads shared by several runs at once (see ``batch.BatchRunner``).
+
+    Every run submits through its own lane. An idle worker takes the next
+    call from the lanes in turn, so a root with thousands of files queued
+    cannot starve one with a handful, and at most ``per_device`` calls touch
+    the same ``st_dev`` at once over all runs. Calls for a busy device stay
+    queued without holding a thread; a lane hands out its oldest call for a
+    device that has room, so they never delay calls for other devices.
+    """
+
+    def __init__(self, workers, per_device=None):
+        self.workers = max(1, int(workers or 1))
+        self.per_device = max(1, int(per_device or self.workers))
+        self._cond = threading.Condition()
+        # Lanes with calls queued, in the order they get their next turn.
+        self._turns = deque()
+        self._busy = {}
+        self._closed = False
+        self._threads = [threading.Thread(target=self._work, name=f"pool-{n}", daemon=True)
+                         for n in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def lane(self):
+        return _Lane(self)
+
+    def _submit(self, lane, device, fn, args):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("worker pool is shut down")
+            if not lane.calls:
+                self._turns.append(lane)
+            lane.calls.append((device, fn, args, future))
+            self._cond.notify()
+        return future
+
+    def _next_call(self):
+        # Called with the lock held.
+        turns = self._turns
+        busy = self._busy
+        for _ in range(len(turns)):
+            lane = turns[0]
+            turns.rotate(-1)
+            calls = lane.calls
+            for index, call in enumerate(calls):
+                device = call[0]
+                if busy.get(device, 0) < self.per_device:
+                    del calls[index]
+                    if not calls:
+                        # It was just rotated to the back.
+                        turns.pop()
+                    busy[device] = busy.get(device, 0) + 1
+                    return call
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                call = self._next_call()
+                while call is None:
+                    if self._closed and not self._turns:
+                        return
+                    self._cond.wait()
+                    call = self._next_call()
+            device, fn, args, future = call
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            with self._cond:
+                self._busy[device] -= 1
+                # A freed device may unblock a lane another worker passed over.
+                self._cond.notify_all()
+
+    def shutdown(self):
+        """Run what is still queued, then stop the threads."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+
+class _Lane:
+    __slots__ = ("pool", "calls")
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.calls = deque()
+
+    def submit(self, device, fn, args):
+        return self.pool._submit(self, device, fn, args)
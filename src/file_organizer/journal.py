@@ -0,0 +1,355 @@
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from .engine import Reporter
+from .executor import MoveExecutor
+from .transfer import Transfer, move_file
+
+JOURNAL_DIRNAME = "journals"
+# Journals kept per journal folder; older ones are deleted when a new run starts.
+JOURNAL_KEEP = 20
+
+# Journals of runs still going in this process (a batch runs several at
+# once): a name is never handed out twice, and an open journal is never pruned.
+_active = set()
+_active_lock = threading.Lock()
+
+
+def user_data_dir():
+    """Per-user folder for data the organizer writes on its own (never the install folder)."""
+    if sys.platform == "win32":
+        base = os.getenv("LOCALAPPDATA") or os.getenv("APPDATA")
+        return Path(base) / "FileOrganizer" if base else Path.home() / "AppData" / "Local" / "FileOrganizer"
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Application Support" / "FileOrganizer"
+    return Path(os.getenv("XDG_DATA_HOME") or Path.home() / ".local" / "share") / "file-organizer"
+
+
+def default_journal_dir():
+    """Journals live in a ``journals`` folder in the per-user data folder."""
+    return user_data_dir() / JOURNAL_DIRNAME
+
+
+def list_journals(journal_dir):
+    """Journal files in ``journal_dir``, oldest first."""
+    journal_dir = Path(journal_dir)
+    if not journal_dir.is_dir():
+        return []
+    return sorted(journal_dir.glob("*.jsonl"))
+
+
+def latest_journal(journal_dir):
+    journals = list_journals(journal_dir)
+    return journals[-1] if journals else None
+
+
+def prune_journals(journal_dir, keep=JOURNAL_KEEP):
+    for old in list_journals(journal_dir)[:-keep or None]:
+        if old in _active:
+            continue
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+class MoveJournal:
+    """Append-only JSON Lines record of the moves of one run.
+
+    Every move is written as a ``plan`` record before it happens and
+    followed by ``done`` or ``fail`` once its outcome is known. Records are
+    buffered and fsynced in batches: the caller asks ``due()`` after
+    planning a move and, when it says so, calls ``sync()`` before starting
+    the moves planned since the last sync. That way a rename never happens
+    before its plan record is on disk, without an fsync per file.
+
+    ``open()`` creates the file up front, so a journal that cannot be
+    written is noticed before the first move; a journal closed without any
+    move planned is deleted again, so runs that move nothing leave none
+    behind. Paths are written with JSON escapes, so names that are not
+    valid UTF-8 survive the round trip.
+    """
+
+    def __init__(self, path, root, sync_every=512, sync_interval=1.0):
+        self.path = Path(path)
+        # Absolute, so undo and resume work from any working directory.
+        self.root = os.path.abspath(os.fspath(root)) if root else ""
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._file = None
+        self._created = False
+        self._next_id = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @classmethod
+    def create(cls, journal_dir, root, **kwargs):
+        """A new journal in ``journal_dir``; names sort in creation order."""
+        journal_dir = Path(journal_dir)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        counter = 0
+        with _active_lock:
+            while True:
+                path = journal_dir / f"{stamp}-{counter:03d}.jsonl"
+                if path not in _active and not path.exists():
+                    _active.add(path)
+                    return cls(path, root, **kwargs)
+                counter += 1
+
+    @classmethod
+    def append_to(cls, path, **kwargs):
+        """Reopen an existing journal to add outcome records (used by undo and resume)."""
+        journal = cls(path, "", **kwargs)
+        journal._file = journal.path.open("a", encoding="utf-8")
+        return journal
+
+    def open(self):
+        """Create the journal file now; raises OSError when it cannot be written."""
+        if self._file is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        prune_journals(self.path.parent, JOURNAL_KEEP - 1)
+        self._file = self.path.open("a", encoding="utf-8")
+        self._created = True
+        header = {"op": "run", "root": self.root, "started": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._file.write(json.dumps(header) + "\n")
+        self._unsynced += 1
+
+    def _write(self, record):
+        if self._file is None:
+            self.open()
+        self._file.write(json.dumps(record) + "\n")
+        self._unsynced += 1
+
+    def plan(self, src, dst, mode="move"):
+        """Record a move (or, per ``mode``, a copy or link) that is about to happen; returns its id."""
+        move_id = self._next_id
+        self._next_id += 1
+        record = {"op": "plan", "id": move_id, "src": os.path.abspath(os.fspath(src)),
+                  "dst": os.path.abspath(os.fspath(dst))}
+        if mode != "move":
+            record["mode"] = mode
+        self._write(record)
+        return move_id
+
+    def done(self, move_id):
+        self._write({"op": "done", "id": move_id})
+
+    def fail(self, move_id, error):
+        self._write({"op": "fail", "id": move_id, "error": str(error)})
+
+    def undone(self, move_id):
+        self._write({"op": "undone", "id": move_id})
+
+    def due(self):
+        """True when enough records are buffered that the next batch should be synced."""
+        return self._unsynced >= self.sync_every or (
+            self._unsynced and time.monotonic() - self._last_sync >= self.sync_interval)
+
+    def sync(self):
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self, finished=True):
+        _active.discard(self.path)
+        if self._file is None:
+            return
+        if self._created and self._next_id == 0:
+            self._file.close()
+            self._file = None
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+            return
+        if finished:
+            self._write({"op": "end"})
+        self.sync()
+        self._file.close()
+        self._file = None
+
+
+def open_journal(journal_dir, root, log):
+    """A new, already opened journal, or None (after logging a warning) if it cannot be written.
+
+    A run goes on without undo rather than stopping because of its journal.
+    """
+    journal = MoveJournal.create(journal_dir, root)
+    try:
+        journal.open()
+    except OSError as e:
+        journal.close()
+        log(f"Warning: cannot write a move journal ({e}); this run cannot be undone.")
+        return None
+    return journal
+
+
+class JournalState:
+    """What a journal file says happened: the planned moves and their outcome."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.root = None
+        self.moves = {}
+        # Transfer mode per move id; absent means "move".
+        self.modes = {}
+        self.outcome = {}
+        self.finished = False
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash; everything before it is intact.
+                    break
+                op = record.get("op")
+                if op == "run":
+                    self.root = record.get("root")
+                elif op == "plan":
+                    self.moves[record["id"]] = (record["src"], record["dst"])
+                    if "mode" in record:
+                        self.modes[record["id"]] = record["mode"]
+                elif op in ("done", "fail", "undone"):
+                    self.outcome[record["id"]] = op
+                elif op == "end":
+                    self.finished = True
+
+    def unfinished(self):
+        """Planned moves without a recorded outcome, in plan order."""
+        return [(move_id, src, dst) for move_id, (src, dst) in sorted(self.moves.items())
+                if move_id not in self.outcome]
+
+    def completed(self):
+        """Moves that were done (and not undone yet), in plan order."""
+        return [(move_id, src, dst) for move_id, (src, dst) in sorted(self.moves.items())
+                if self.outcome.get(move_id) == "done"]
+
+
+def _move_no_clobber(src, dst):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    move_file(src, dst)
+
+
+def _remove_copy(copy, original):
+    """Undo a copy or link: delete it, or move it back if the original is gone meanwhile."""
+    if os.path.lexists(original):
+        os.unlink(copy)
+    else:
+        _move_no_clobber(copy, original)
+
+
+def _transfer_no_clobber(mode):
+    transfer = Transfer(mode)
+
+    def run(src, dst):
+        if os.path.lexists(dst):
+            raise FileExistsError(f"{dst} already exists")
+        transfer(src, dst)
+    return run
+
+
+def _device_of(path):
+    try:
+        return os.lstat(path).st_dev
+    except OSError:
+        return None
+
+
+def _replay(journal, moves, executor, reporter, on_done, label, operations=None):
+    """Run ``moves`` ((id, from, to) triples) through the executor with batched journal syncs.
+
+    ``operations`` maps move ids to the function doing the work, by default a move.
+    """
+    operations = operations or {}
+    summary = {"journal": str(journal.path), "moved": 0, "errors": 0}
+
+    def finished(context, error):
+        move_id, src, dst = context
+        if error is None:
+            on_done(move_id)
+            summary["moved"] += 1
+            reporter.log(f"{label}: {src} → {dst}")
+        else:
+            summary["errors"] += 1
+            reporter.log(f"Error moving {src}: {str(error)}")
+        total = len(moves)
+        done = summary["moved"] + summary["errors"]
+        reporter.progress(done, total)
+        reporter.status(f"{label}... {done}/{total} files")
+
+    try:
+        for move_id, src, dst in moves:
+            device = _device_of(src) if executor.parallel else None
+            operation = operations.get(move_id, _move_no_clobber)
+            for context, error in executor.submit(device, operation, src, dst,
+                                                  context=(move_id, src, dst)):
+                finished(context, error)
+            if journal.due():
+                journal.sync()
+    finally:
+        for context, error in executor.finish():
+            finished(context, error)
+        journal.sync()
+    return summary
+
+
+def undo_journal(path, workers=1, per_device=None, reporter=None):
+    """Move every completed move of a journal back, newest first.
+
+    Progress is appended to the same journal as ``undone`` records, so an
+    interrupted undo can simply be run again.
+    """
+    reporter = reporter or Reporter()
+    state = JournalState(path)
+    moves = [(move_id, dst, src) for move_id, src, dst in reversed(state.completed())]
+    # Copies and links are removed rather than moved back over their source.
+    operations = {move_id: _remove_copy for move_id in state.modes}
+    reporter.log(f"Undoing {len(moves)} moves from {state.path.name}")
+    journal = MoveJournal.append_to(state.path)
+    try:
+        summary = _replay(journal, moves, MoveExecutor(workers, per_device), reporter,
+                          journal.undone, "Restored", operations)
+    finally:
+        journal.close(finished=False)
+    reporter.log(f"Undo complete! Restored {summary['moved']} files.")
+    reporter.status("Ready")
+    return summary
+
+
+def resume_journal(path, workers=1, per_device=None, reporter=None):
+    """Finish the moves an interrupted run had planned, without walking the folder again.
+
+    A planned move whose source is gone and whose target exists (a copy or
+    link whose target exists) already happened before the interruption and
+    is only marked done.
+    """
+    reporter = reporter or Reporter()
+    state = JournalState(path)
+    journal = MoveJournal.append_to(state.path)
+    todo = []
+    operations = {}
+    for move_id, src, dst in state.unfinished():
+        mode = state.modes.get(move_id, "move")
+        if os.path.lexists(dst) and (mode != "move" or not os.path.lexists(src)):
+            # Copies only appear under their name once complete.
+            journal.done(move_id)
+            continue
+        todo.append((move_id, src, dst))
+        if mode != "move":
+            operations[move_id] = _transfer_no_clobber(mode)
+    reporter.log(f"Resuming {len(todo)} planned moves from {state.path.name}")
+    try:
+        summary = _replay(journal, todo, MoveExecutor(workers, per_device), reporter,
+                          journal.done, "Moved", operations)
+    finally:
+        journal.close(finished=True)
+    reporter.log(f"Resume complete! Moved {summary['moved']} files.")
+    reporter.status("Ready")
+    return summary
@@ -0,0 +1,123 @@
+import os
+import time
+
+# os functions that cost a round trip to the server on a network mount.
+SLOW_CALLS = ("stat", "lstat", "scandir", "listdir", "mkdir", "rename", "replace", "link",
+              "unlink", "rmdir", "open", "utime")
+
+
+class SimulatedLatency:
+    """Makes local filesystem calls as slow as a network share, to test the async pipeline.
+
+    While active, every call to one of ``calls`` through the ``os`` module
+    (which is also what ``pathlib`` uses on Python 3.10+) first sleeps for
+    ``seconds``. Entries returned by ``os.scandir`` are wrapped so their
+    first ``stat()`` pays the delay too, like a DirEntry on NFS or SMB; type
+    checks (``is_dir``/``is_file``) stay free, as they come with the listing.
+    The sleep releases the GIL, so concurrent callers overlap their waits
+    the way requests to a real server do.
+
+        with SimulatedLatency(0.002):
+            FileOrganizer(folders, options).run(folder)
+
+    It patches the ``os`` module for the whole process: use it in tests and
+    benchmarks only, and not from two threads at once.
+    """
+
+    def __init__(self, seconds, calls=SLOW_CALLS):
+        self.seconds = seconds
+        self.calls = tuple(calls)
+        self._saved = {}
+
+    def __enter__(self):
+        delay = self.seconds
+        for name in self.calls:
+            original = getattr(os, name)
+            self._saved[name] = original
+            if name == "scandir":
+                setattr(os, name, _slow_scandir(original, delay))
+            else:
+                setattr(os, name, _slow_call(original, delay))
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, original in self._saved.items():
+            setattr(os, name, original)
+        self._saved.clear()
+        return False
+
+
+def _slow_call(fn, delay):
+    def call(*args, **kwargs):
+        time.sleep(delay)
+        return fn(*args, **kwargs)
+    call.__name__ = fn.__name__
+    call.__doc__ = fn.__doc__
+    return call
+
+
+def _slow_scandir(scandir, delay):
+    def call(path="."):
+        time.sleep(delay)
+        return _SlowListing(scandir(path), delay)
+    call.__name__ = scandir.__name__
+    return call
+
+
+class _SlowListing:
+    def __init__(self, listing, delay):
+        self._listing = listing
+        self._delay = delay
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return _SlowEntry(next(self._listing), self._delay)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        self._listing.close()
+
+
+class _SlowEntry:
+    """A DirEntry whose first ``stat()`` per mode costs a round trip."""
+
+    __slots__ = ("_entry", "_delay", "_paid", "name", "path")
+
+    def __init__(self, entry, delay):
+        self._entry = entry
+        self._delay = delay
+        self._paid = set()
+        self.name = entry.name
+        self.path = entry.path
+
+    def stat(self, *, follow_symlinks=True):
+        if follow_symlinks not in self._paid:
+            time.sleep(self._delay)
+            self._paid.add(follow_symlinks)
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+    def is_dir(self, *, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, *, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def inode(self):
+        return self._entry.inode()
+
+    def __fspath__(self):
+        return self.path
+
+    def __repr__(self):
+        return f"<SlowEntry {self.name!r}>"
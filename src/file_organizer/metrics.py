@@ -0,0 +1,192 @@
+import json
+import os
+import threading
+import time
+
+# Steps of a run, in pipeline order. All but "rename" are measured on the
+# planning thread; "rename" sums the individual moves over all workers.
+PHASES = ("walk", "stat", "classify", "collisions", "mkdir", "dedup", "journal", "rename")
+
+_PROM_PREFIX = "file_organizer"
+
+
+def volume_label(path):
+    """Mount point of the volume holding ``path``."""
+    path = os.path.abspath(os.fspath(path))
+    while not os.path.ismount(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+class RunMetrics:
+    """Per-phase wall time, counters and per-category / per-volume totals of one run."""
+
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.counters = {"files": 0, "stats": 0, "mkdirs": 0, "renames": 0, "errors": 0,
+                         "bytes_moved": 0, "checkpoints": 0}
+        self.categories = {}
+        self.volumes = {}
+        self.started = time.time()
+        self.total_seconds = 0.0
+        self._volume_paths = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, table, key):
+        # Called with _lock held.
+        bucket = table.get(key)
+        if bucket is None:
+            bucket = table[key] = {"files": 0, "bytes": 0, "rename_seconds": 0.0}
+        return bucket
+
+    def note_volume(self, device, path):
+        """Remember a path on ``device`` so the volume can be named in reports."""
+        if device not in self._volume_paths:
+            self._volume_paths[device] = path
+
+    def planned(self, category, device, size):
+        """Count a file a preview would move."""
+        # Worker threads create buckets too (see ``timed``).
+        with self._lock:
+            for bucket in (self._bucket(self.categories, category), self._bucket(self.volumes, device)):
+                bucket["files"] += 1
+                bucket["bytes"] += size
+
+    def moved(self, category, device, size):
+        self.counters["renames"] += 1
+        self.counters["bytes_moved"] += size
+        self.planned(category, device, size)
+
+    def timed(self, fn, category, device):
+        """Wrap ``fn`` so its duration counts towards the rename phase, its category and volume.
+
+        The wrapper runs on worker threads, hence the lock.
+        """
+        def call(*args):
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.phases["rename"] += elapsed
+                    self._bucket(self.categories, category)["rename_seconds"] += elapsed
+                    self._bucket(self.volumes, device)["rename_seconds"] += elapsed
+        return call
+
+    def finish(self, total_seconds):
+        self.total_seconds = total_seconds
+
+    def to_dict(self):
+        volumes = {}
+        for device, bucket in self.volumes.items():
+            path = self._volume_paths.get(device)
+            label = volume_label(path) if path is not None else "unknown"
+            merged = volumes.setdefault(label, {"files": 0, "bytes": 0, "rename_seconds": 0.0})
+            for key, value in bucket.items():
+                merged[key] += value
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "timestamp": round(self.started, 3),
+            "total_seconds": round(self.total_seconds, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "counters": dict(self.counters),
+            "categories": _rounded(self.categories),
+            "volumes": _rounded(volumes),
+        }
+
+
+def _rounded(table):
+    return {key: dict(bucket, rename_seconds=round(bucket["rename_seconds"], 6))
+            for key, bucket in sorted(table.items(), key=lambda item: str(item[0]))}
+
+
+def format_report(metrics):
+    """Human-readable lines for a ``RunMetrics.to_dict()`` result."""
+    counters = metrics["counters"]
+    megabytes = counters["bytes_moved"] / (1024 * 1024)
+    lines = [
+        f"Run metrics: {metrics['total_seconds']:.2f}s total, {counters['files']} files, "
+        f"{counters['renames']} moved ({megabytes:.1f} MB), {counters['errors']} errors, "
+        f"{counters['stats']} stats, {counters['mkdirs']} folders created",
+        "  Phases: " + ", ".join(f"{name} {seconds:.3f}s"
+                                 for name, seconds in metrics["phases"].items() if seconds),
+    ]
+    for title, table in (("Category", metrics["categories"]), ("Volume", metrics["volumes"])):
+        for key, bucket in table.items():
+            lines.append(f"  {title} {key}: {bucket['files']} files, "
+                         f"{bucket['bytes'] / (1024 * 1024):.1f} MB, "
+                         f"{bucket['rename_seconds']:.3f}s moving")
+    return lines
+
+
+def _write_atomic(path, text):
+    # Collectors may read the file at any moment; never let them see half of it.
+    path = os.fspath(path)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def write_json(path, metrics, root):
+    _write_atomic(path, json.dumps(dict(metrics, root=os.path.abspath(root)), indent=2) + "\n")
+
+
+def write_batch_json(path, runs):
+    """``write_json`` for the ``(metrics, root)`` pairs of a batch: ``{"roots": [...]}``."""
+    roots = [dict(metrics, root=os.path.abspath(root)) for metrics, root in runs]
+    _write_atomic(path, json.dumps({"roots": roots}, indent=2) + "\n")
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def prometheus_text(metrics, root):
+    """Metrics in the Prometheus text exposition format, e.g. for node_exporter's textfile collector."""
+    return prometheus_batch_text([(metrics, root)])
+
+
+def prometheus_batch_text(runs):
+    """``prometheus_text`` for several ``(metrics, root)`` pairs, told apart by their root label."""
+    # name -> (help, sample lines); every metric is written once with the samples of all roots.
+    families = {}
+
+    def metric(root, name, help_text, samples):
+        lines = families.setdefault(name, (help_text, []))[1]
+        for labels, value in samples:
+            label_text = ",".join([f'root="{root}"'] + [f'{k}="{_label(v)}"' for k, v in labels])
+            lines.append(f"{_PROM_PREFIX}_{name}{{{label_text}}} {value}")
+
+    for metrics, root in runs:
+        root = _label(os.path.abspath(root))
+        metric(root, "last_run_timestamp_seconds", "Start time of the last run.",
+               [((), metrics["timestamp"])])
+        metric(root, "run_seconds", "Wall time of the last run.", [((), metrics["total_seconds"])])
+        metric(root, "phase_seconds", "Time spent per phase of the last run.",
+               [((("phase", name),), seconds) for name, seconds in metrics["phases"].items()])
+        for name, value in metrics["counters"].items():
+            metric(root, name, f"Number of {name.replace('_', ' ')} in the last run.", [((), value)])
+        for title, table in (("category", metrics["categories"]), ("volume", metrics["volumes"])):
+            for field in ("files", "bytes", "rename_seconds"):
+                metric(root, f"{title}_{field}",
+                       f"Per-{title} {field.replace('_', ' ')} of the last run.",
+                       [(((title, key),), bucket[field]) for key, bucket in table.items()])
+    out = []
+    for name, (help_text, lines) in families.items():
+        out.append(f"# HELP {_PROM_PREFIX}_{name} {help_text}")
+        out.append(f"# TYPE {_PROM_PREFIX}_{name} gauge")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
+
+
+def write_textfile(path, metrics, root):
+    _write_atomic(path, prometheus_text(metrics, root))
+
+
+def write_batch_textfile(path, runs):
+    _write_atomic(path, prometheus_batch_text(runs))
@@ -0,0 +1,207 @@
+import csv
+import json
+import os
+import sys
+import time
+
+PLAN_COLUMNS = ("src", "category", "dst", "size", "mtime_ns", "link")
+
+
+def _inside(path, folder):
+    """True when ``path`` lies below ``folder`` once '..' and symlinks are resolved."""
+    path = os.path.realpath(path)
+    folder = os.path.realpath(folder)
+    try:
+        return path != folder and os.path.commonpath([path, folder]) == folder
+    except ValueError:
+        # Different drives on Windows.
+        return False
+
+
+def _checked(base, record, number):
+    """``(src, category, dst, link)`` of a loaded record as full paths; ValueError if it leaves the root."""
+    category = record["category"]
+    if category in ("", os.curdir, os.pardir) or any(
+            sep and sep in category for sep in ("/", os.sep, os.altsep)):
+        raise ValueError(f"row {number}: invalid category {category!r}")
+    src = os.path.join(base, record["src"])
+    dst = os.path.join(base, record["dst"])
+    link = record.get("link") or None
+    if link is not None:
+        link = os.path.join(base, link)
+    for what, path in (("src", src), ("dst", dst), ("link", link)):
+        if path is not None and not _inside(path, base):
+            raise ValueError(f"row {number}: {what} {record[what]!r} is outside {base}")
+    if not _inside(dst, os.path.join(base, category)):
+        raise ValueError(f"row {number}: dst {record['dst']!r} is not in the {category!r} folder")
+    return src, category, dst, link
+
+
+class PlanEntry:
+    """A planned move, usable wherever the engine expects a DirEntry.
+
+    ``stat()`` returns the one ``lstat`` made by ``unchanged()``, so applying
+    a plan costs a single system call per file before the rename.
+    """
+
+    __slots__ = ("path", "name", "category", "target", "link", "size", "mtime_ns", "_stat")
+
+    def __init__(self, path, category, target, size, mtime_ns, link=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.category = category
+        self.target = target
+        self.link = link
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self._stat = None
+
+    def unchanged(self):
+        """True when the source still has the size and mtime it had when the plan was made."""
+        try:
+            self._stat = os.lstat(self.path)
+        except OSError:
+            return False
+        return (self._stat.st_size, self._stat.st_mtime_ns) == (self.size, self.mtime_ns)
+
+    def stat(self, follow_symlinks=True):
+        if self._stat is None:
+            self._stat = os.lstat(self.path)
+        return self._stat
+
+    def __repr__(self):
+        return f"<PlanEntry {self.path!r} -> {self.target!r}>"
+
+
+class MovePlan:
+    """The moves a preview decided on, kept so they can be reviewed, edited and applied.
+
+    Rows are tuples of ``(src_dir, src_name, category, dst_dir, dst_name,
+    size, mtime_ns, link)``; directory paths are stored once in ``dirs``
+    and referenced by index, and category names are interned, so a plan for
+    millions of files stays small. ``size`` and ``mtime_ns`` are the source's
+    stat signature when the plan was made; ``link`` is the original a
+    duplicate is hard-linked to, or None.
+
+    Plans are saved as JSON Lines (a header line with the root folder, then
+    one object per move) or, for a ``.csv`` path, as CSV. Paths in the file
+    are relative to the root so the plan stays readable and can be applied
+    to the same tree under a different path.
+    """
+
+    def __init__(self, root):
+        self.root = os.fspath(root)
+        self.dirs = []
+        self._dir_ids = {}
+        self.rows = []
+
+    def _dir_id(self, path):
+        dir_id = self._dir_ids.get(path)
+        if dir_id is None:
+            dir_id = self._dir_ids[path] = len(self.dirs)
+            self.dirs.append(path)
+        return dir_id
+
+    def add(self, src, category, target, size, mtime_ns, link=None):
+        src_dir, src_name = os.path.split(os.fspath(src))
+        dst_dir, dst_name = os.path.split(os.fspath(target))
+        self.rows.append((self._dir_id(src_dir), src_name, sys.intern(category),
+                          self._dir_id(dst_dir), dst_name, size, mtime_ns,
+                          None if link is None else os.fspath(link)))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        """``(src, category, target, size, mtime_ns, link)`` with full paths, in plan order."""
+        dirs = self.dirs
+        for src_dir, src_name, category, dst_dir, dst_name, size, mtime_ns, link in self.rows:
+            yield (os.path.join(dirs[src_dir], src_name), category,
+                   os.path.join(dirs[dst_dir], dst_name), size, mtime_ns, link)
+
+    def entries(self):
+        """PlanEntry objects to apply: plain moves first, hard links after the originals are in place."""
+        linked = []
+        for src, category, target, size, mtime_ns, link in self:
+            entry = PlanEntry(src, category, target, size, mtime_ns, link)
+            if link is None:
+                yield entry
+            else:
+                linked.append(entry)
+        for entry in linked:
+            yield entry
+
+    # --- files ---
+
+    def _relative_rows(self):
+        root = self.root
+        rel_dirs = [os.path.relpath(path, root) for path in self.dirs]
+        for src_dir, src_name, category, dst_dir, dst_name, size, mtime_ns, link in self.rows:
+            yield (os.path.normpath(os.path.join(rel_dirs[src_dir], src_name)), category,
+                   os.path.normpath(os.path.join(rel_dirs[dst_dir], dst_name)), size, mtime_ns,
+                   None if link is None else os.path.relpath(link, root))
+
+    def save(self, path):
+        """Write the plan to ``path`` (CSV for a ``.csv`` name) through a temporary file.
+
+        Names that are not valid UTF-8 are kept: JSON escapes them, and CSV
+        files carry their original bytes.
+        """
+        path = os.fspath(path)
+        tmp = f"{path}.tmp"
+        try:
+            if path.lower().endswith(".csv"):
+                with open(tmp, "w", encoding="utf-8", errors="surrogateescape", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(PLAN_COLUMNS)
+                    for src, category, dst, size, mtime_ns, link in self._relative_rows():
+                        writer.writerow((src, category, dst, size, mtime_ns, link or ""))
+            else:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    header = {"op": "plan", "root": os.path.abspath(self.root), "count": len(self.rows),
+                              "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                    f.write(json.dumps(header) + "\n")
+                    for src, category, dst, size, mtime_ns, link in self._relative_rows():
+                        record = {"src": src, "category": category, "dst": dst,
+                                  "size": size, "mtime_ns": mtime_ns}
+                        if link is not None:
+                            record["link"] = link
+                        f.write(json.dumps(record) + "\n")
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path, root=None):
+        """Read a saved plan.
+
+        ``root`` overrides the folder recorded in a JSON Lines plan and is
+        required for CSV plans, which do not record one. A plan that was
+        edited to reach outside the root, or to put a file anywhere but in
+        its category folder, is rejected with ValueError.
+        """
+        path = os.fspath(path)
+        with open(path, "r", encoding="utf-8", errors="surrogateescape", newline="") as f:
+            if path.lower().endswith(".csv"):
+                if root is None:
+                    raise ValueError("CSV plans need the folder they apply to")
+                records = csv.DictReader(f)
+            else:
+                header = json.loads(f.readline() or "{}")
+                if header.get("op") != "plan":
+                    raise ValueError(f"{path} is not a move plan")
+                root = root if root is not None else header["root"]
+                records = (json.loads(line) for line in f if line.strip())
+            plan = cls(root)
+            base = plan.root
+            for number, record in enumerate(records, 1):
+                try:
+                    src, category, dst, link = _checked(base, record, number)
+                except ValueError as e:
+                    raise ValueError(f"{path}: {e}") from None
+                plan.add(src, category, dst, int(record["size"]), int(record["mtime_ns"]), link)
+        return plan
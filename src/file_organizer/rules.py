@@ -0,0 +1,278 @@
+import fnmatch
+import json
+import re
+import time
+
+# Trie node key that cannot clash with the single characters used for edges.
+_RULES = 0
+
+_GLOB_CHARS = "*?["
+_SIZE_UNITS = {"b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3, "tb": 1024 ** 4}
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?b)?\s*$", re.IGNORECASE)
+# Regexes that cannot be spliced into the combined pattern: global flags,
+# named groups and backreferences would break or change meaning there.
+_UNCOMBINABLE_RE = re.compile(r"^\(\?[aiLmsux]+\)|\(\?P[<=]|\\[1-9]")
+_DAY = 86400.0
+# Alternatives per combined pattern; see RuleMatcher.
+CHUNK_PATTERNS = 100
+
+
+def parse_size(value):
+    """Bytes for ``1048576``, ``"500KB"``, ``"1.5 GB"``... (1024-based units)."""
+    if isinstance(value, bool):
+        raise ValueError(f"invalid size: {value!r}")
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _SIZE_RE.match(str(value))
+    if match is None:
+        raise ValueError(f"invalid size: {value!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[(match.group(2) or "b").lower()])
+
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+class Rule:
+    """One entry of the ``_rules`` list: a matcher, optional conditions and a category."""
+
+    __slots__ = ("index", "category", "suffixes", "globs", "regex", "min_size", "max_size",
+                 "older_than", "newer_than", "_compiled")
+
+    def __init__(self, index, spec):
+        if not isinstance(spec, dict):
+            raise ValueError("a rule must be an object")
+        self.index = index
+        category = spec.get("category")
+        if not isinstance(category, str) or not category.strip() or \
+                category.strip().startswith((".", "_")) or any(sep in category for sep in "/\\"):
+            raise ValueError(f"invalid category: {category!r}")
+        self.category = category.strip()
+        self.suffixes = ["." + s.strip().lstrip(".").lower()
+                         for s in _as_list(spec.get("suffix", [])) if s.strip().lstrip(".")]
+        self.globs = [g for g in _as_list(spec.get("glob", [])) if g]
+        self.regex = spec.get("regex")
+        if not (self.suffixes or self.globs or self.regex):
+            raise ValueError("a rule needs a suffix, glob or regex")
+        self._compiled = re.compile(self.regex) if self.regex else None
+        self.min_size = parse_size(spec["min_size"]) if "min_size" in spec else None
+        self.max_size = parse_size(spec["max_size"]) if "max_size" in spec else None
+        self.older_than = float(spec["older_than_days"]) * _DAY if "older_than_days" in spec else None
+        self.newer_than = float(spec["newer_than_days"]) * _DAY if "newer_than_days" in spec else None
+
+    @property
+    def conditional(self):
+        return not (self.min_size is None and self.max_size is None
+                    and self.older_than is None and self.newer_than is None)
+
+    def conditions_hold(self, entry):
+        """Size and age checks; needs a stat, so it only runs for rules that would otherwise win."""
+        if entry is None:
+            return False
+        try:
+            st = entry.stat()
+        except OSError:
+            return False
+        if self.min_size is not None and st.st_size < self.min_size:
+            return False
+        if self.max_size is not None and st.st_size > self.max_size:
+            return False
+        if self.older_than is not None or self.newer_than is not None:
+            age = time.time() - st.st_mtime
+            if self.older_than is not None and age < self.older_than:
+                return False
+            if self.newer_than is not None and age > self.newer_than:
+                return False
+        return True
+
+    def name_matches(self, name):
+        lower = name.lower()
+        if any(lower.endswith(suffix) for suffix in self.suffixes):
+            return True
+        if any(fnmatch.fnmatchcase(lower, glob.lower()) for glob in self.globs):
+            return True
+        return self._compiled is not None and self._compiled.search(name) is not None
+
+
+class RuleMatcher:
+    """Classifies file names by ``_rules`` and the category mapping in one pass.
+
+    Rules are evaluated as an ordered list where the first matching rule
+    wins, but not one by one. At load time they are compiled into:
+
+    - a trie over reversed, lower-cased name suffixes, holding suffix rules
+      and globs of the form ``*literal``, so one walk over the end of a name
+      finds every suffix rule that applies;
+    - a trie over lower-cased name prefixes for the other globs that start
+      with literal text (``IMG_*``), and the suffix trie for those that end
+      with it (``*_final*.doc``); a walk only turns up the few globs whose
+      literal part fits the name, and only those are tried in full;
+    - for regexes and globs without literal ends, combined regular
+      expressions of at most ``CHUNK_PATTERNS`` alternatives in rule order,
+      so the first alternative that matches is the earliest pattern rule
+      of its chunk. (``re`` tries alternatives one by one, so a single
+      pattern over thousands of rules would be slower than a plain loop.)
+
+    The winner is the lowest rule index among those hits. Rules with size
+    or age conditions only cost a stat when they would otherwise win. If no
+    rule matches, the longest extension of the category mapping applies
+    (``backup.tar.gz`` matches ``tar.gz`` before ``gz``); without rules that
+    is all ``match`` does, at the cost of one dictionary lookup per dotted
+    part the longest mapped extension has.
+    """
+
+    def __init__(self, extension_index, rules=None):
+        self.extensions = extension_index
+        self._ext_parts = max((ext.count(".") + 1 for ext in extension_index), default=1)
+        self.rules = []
+        self.errors = []
+        # Trie nodes hold (rule index, glob to confirm or None) under _RULES.
+        self._trie = {}
+        self._confirm = {}
+        self._prefix_trie = {}
+        self._separate = []
+        parts = []
+        for index, spec in enumerate(rules or []):
+            try:
+                rule = Rule(index, spec)
+            except (ValueError, TypeError, KeyError, re.error) as e:
+                self.errors.append(f"Warning: ignoring rule {index + 1}: {e}")
+                continue
+            self.rules.append(rule)
+            for suffix in rule.suffixes:
+                self._add(self._trie, suffix[::-1], rule.index)
+            for glob in rule.globs:
+                self._add_glob(glob.lower(), rule, parts)
+            if rule.regex:
+                if rule.conditional or _UNCOMBINABLE_RE.search(rule.regex):
+                    self._separate.append(rule)
+                else:
+                    parts.append((rule.index, "(?:.*?(?:%s))" % rule.regex))
+        self._by_index = {rule.index: rule for rule in self.rules}
+        self._chunks = []
+        for start in range(0, len(parts), CHUNK_PATTERNS):
+            chunk = parts[start:start + CHUNK_PATTERNS]
+            try:
+                combined = re.compile("|".join(f"(?P<r{index}>{part})" for index, part in chunk))
+            except re.error:
+                # Some pattern only compiles on its own; fall back to one search per rule.
+                self._separate.extend(self._by_index[index] for index, _part in chunk)
+                continue
+            self._chunks.append((chunk[0][0], combined))
+        self._separate = sorted(set(self._separate), key=lambda rule: rule.index)
+        for trie in (self._trie, self._prefix_trie):
+            for node in self._walk_nodes(trie):
+                if _RULES in node:
+                    node[_RULES] = sorted(set(node[_RULES]), key=lambda hit: hit[0])
+        self.categories = []
+        for rule in self.rules:
+            if rule.category not in self.categories:
+                self.categories.append(rule.category)
+
+    def _add_glob(self, glob, rule, parts):
+        """File a lower-cased glob under its longest literal end, or with the combined patterns."""
+        literal = glob[1:]
+        if glob.startswith("*") and not any(c in literal for c in _GLOB_CHARS):
+            self._add(self._trie, literal[::-1], rule.index)
+            return
+        # Text before the first and after the last wildcard; a ']' counts as
+        # one, which at worst makes the literal end shorter than it could be.
+        head = re.split(r"[*?\[]", glob, 1)[0]
+        tail = re.split(r"[*?\[\]]", glob)[-1]
+        if head or tail:
+            # "IMG_*" needs nothing but its prefix; others are confirmed by
+            # their full pattern, compiled the first time it is needed.
+            confirm = None if glob == head + "*" else glob
+            if len(head) >= len(tail):
+                self._add(self._prefix_trie, head, rule.index, confirm)
+            else:
+                self._add(self._trie, tail[::-1], rule.index, confirm)
+        elif rule.conditional:
+            self._separate.append(rule)
+        else:
+            parts.append((rule.index, "(?i:%s)" % fnmatch.translate(glob)))
+
+    @staticmethod
+    def _add(trie, key, index, confirm=None):
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node.setdefault(_RULES, []).append((index, confirm))
+
+    def _walk_nodes(self, node):
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            yield current
+            stack.extend(child for key, child in current.items() if isinstance(key, str))
+
+    def match(self, name, entry=None):
+        """``(category, matched)``; category is None when nothing matched.
+
+        ``entry`` (anything with ``stat()``) is only used by conditional rules.
+        """
+        lower = name.lower()
+        if self.rules:
+            best = self._best_rule(name, lower, entry)
+            if best is not None:
+                return self._by_index[best].category, True
+        # Like os.path.splitext, leading dots belong to the stem, which must not be empty.
+        parts = lower.lstrip(".").rsplit(".", self._ext_parts)
+        extensions = self.extensions
+        for i in range(1, len(parts)):
+            category = extensions.get(".".join(parts[i:]))
+            if category is not None:
+                return category, True
+        return None, False
+
+    def _best_rule(self, name, lower, entry):
+        best = None
+        hits = []
+        for trie, chars in ((self._trie, reversed(lower)), (self._prefix_trie, lower)):
+            node = trie
+            if _RULES in node:
+                hits.append(node[_RULES])
+            for ch in chars:
+                node = node.get(ch)
+                if node is None:
+                    break
+                if _RULES in node:
+                    hits.append(node[_RULES])
+        # Lowest rule index over all trie hits; patterns and conditions are
+        # only checked for a rule that would beat the best one found so far.
+        for rules in hits:
+            for index, confirm in rules:
+                if best is not None and index >= best:
+                    break
+                if confirm is not None:
+                    pattern = self._confirm.get(confirm)
+                    if pattern is None:
+                        pattern = self._confirm[confirm] = re.compile(fnmatch.translate(confirm))
+                    if pattern.match(lower) is None:
+                        continue
+                rule = self._by_index[index]
+                if not rule.conditional or rule.conditions_hold(entry):
+                    best = index
+                    break
+        for first, combined in self._chunks:
+            if best is not None and first >= best:
+                break
+            found = combined.match(name)
+            if found is not None:
+                index = int(found.lastgroup[1:])
+                if best is None or index < best:
+                    best = index
+                # Later chunks only hold later rules.
+                break
+        for rule in self._separate:
+            if best is not None and rule.index >= best:
+                break
+            if rule.name_matches(name) and (not rule.conditional or rule.conditions_hold(entry)):
+                best = rule.index
+                break
+        return best
+
+    def fingerprint_data(self):
+        return json.dumps([[rule.index, rule.category, rule.suffixes, rule.globs, rule.regex,
+                            rule.min_size, rule.max_size, rule.older_than, rule.newer_than]
+                           for rule in self.rules])
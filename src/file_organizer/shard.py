@@ -0,0 +1,116 @@
+import hashlib
+import os
+import time
+
+SHARD_MODES = ("off", "date", "hash", "count")
+
+DEFAULT_DATE_FORMAT = "%Y/%m"
+DEFAULT_HASH_CHARS = 2
+DEFAULT_MAX_ENTRIES = 1000
+# Width of the numbered folders of "count" mode: 00001, 00002, ... Wider than
+# a year, so the folders of the "date" layout are never taken for them.
+COUNT_DIGITS = 5
+
+
+class ShardLayout:
+    """Spreads the files of a category over subfolders so no folder grows without bound.
+
+    A layout is written ``MODE[:ARG]``:
+
+    - ``date[:FORMAT]``: by modification time, ``FORMAT`` being a strftime
+      pattern whose ``/`` separate folder levels (default ``%Y/%m``, e.g.
+      ``images/2026/10``);
+    - ``hash[:N]``: by the first ``N`` hex digits of a hash of the name
+      (default 2, i.e. 256 folders such as ``images/3f``);
+    - ``count[:N]``: numbered folders (``images/00001``) of at most ``N``
+      entries each (default 1000), filled one after the other.
+
+    Shard folders live inside the category folder, which the recursive walk
+    never enters, so sharded files are not walked again.
+    """
+
+    def __init__(self, mode, arg=None):
+        if mode not in SHARD_MODES or mode == "off":
+            raise ValueError(f"unknown shard mode: {mode!r}")
+        self.mode = mode
+        if mode == "date":
+            self.date_format = arg or DEFAULT_DATE_FORMAT
+            parts = time.strftime(self.date_format, time.localtime(0)).split("/")
+            if not all(parts) or any(part.startswith(".") or "\\" in part for part in parts):
+                raise ValueError(f"invalid date shard format: {self.date_format!r}")
+        elif mode == "hash":
+            self.hash_chars = _positive(arg, DEFAULT_HASH_CHARS, "hash shard length")
+            if self.hash_chars > 8:
+                raise ValueError("hash shards take at most 8 characters")
+        else:
+            self.max_entries = _positive(arg, DEFAULT_MAX_ENTRIES, "shard size")
+        self.spec = mode if arg is None else f"{mode}:{arg}"
+        # count mode: category folder -> [current shard number, entries in it]
+        self._fill = {}
+
+    @classmethod
+    def parse(cls, spec):
+        """A layout for ``"date:%Y"``-style text; None for ``"off"``, empty or None."""
+        if not spec or spec == "off":
+            return None
+        mode, sep, arg = str(spec).partition(":")
+        return cls(mode.strip().lower(), arg if sep else None)
+
+    def subfolders(self, entry, category_dir):
+        """Folder names, outermost first, between ``category_dir`` and the file."""
+        if self.mode == "date":
+            try:
+                mtime = entry.stat().st_mtime
+            except OSError:
+                return ()
+            return tuple(time.strftime(self.date_format, time.localtime(mtime)).split("/"))
+        if self.mode == "hash":
+            digest = hashlib.sha1(os.fsencode(entry.name)).hexdigest()
+            return (digest[:self.hash_chars],)
+        return (self._next_numbered(os.fspath(category_dir)),)
+
+    def _next_numbered(self, category_dir):
+        fill = self._fill.get(category_dir)
+        if fill is None:
+            fill = self._fill[category_dir] = _last_numbered(category_dir)
+        if fill[1] >= self.max_entries:
+            fill[0] += 1
+            fill[1] = 0
+        fill[1] += 1
+        return str(fill[0]).zfill(COUNT_DIGITS)
+
+
+def _positive(arg, default, what):
+    if arg is None or arg == "":
+        return default
+    try:
+        value = int(arg)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise ValueError(f"{what} must be a positive number, not {arg!r}")
+    return value
+
+
+def _last_numbered(category_dir):
+    """``[number, entries]`` of the highest numbered shard already in ``category_dir``."""
+    last = None
+    try:
+        with os.scandir(category_dir) as it:
+            for entry in it:
+                name = entry.name
+                if len(name) >= COUNT_DIGITS and name.isdigit() and entry.is_dir(follow_symlinks=False):
+                    number = int(name)
+                    if last is None or number > last:
+                        last = number
+    except OSError:
+        pass
+    if last is None:
+        return [1, 0]
+    try:
+        with os.scandir(os.path.join(category_dir, str(last).zfill(COUNT_DIGITS))) as it:
+            count = sum(1 for _ in it)
+    except OSError:
+        # Padded differently from ours; start a fresh shard rather than guess.
+        return [last + 1, 0]
+    return [last, count]
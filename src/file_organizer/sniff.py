@@ -0,0 +1,145 @@
+import os
+import sqlite3
+
+# Bytes read from the start of a file; enough for every signature below.
+HEADER_SIZE = 4096
+
+SNIFF_MODES = ("off", "unknown", "all")
+
+# (offset, magic bytes, category, strong). Strong signatures are specific
+# enough to override a file's extension in "all" mode; weak ones (container
+# formats shared by many file types) only classify files whose extension is
+# unknown.
+SIGNATURES = [
+    (0, b"\x89PNG\r\n\x1a\n", "images", True),
+    (0, b"\xff\xd8\xff", "images", True),
+    (0, b"GIF87a", "images", True),
+    (0, b"GIF89a", "images", True),
+    (0, b"II*\x00", "images", True),
+    (0, b"MM\x00*", "images", True),
+    (8, b"WEBP", "images", True),
+    (0, b"BM", "images", False),
+    (0, b"%PDF-", "documents", True),
+    (0, b"{\\rtf", "documents", True),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "documents", False),
+    (0, b"Rar!\x1a\x07", "archives", True),
+    (0, b"7z\xbc\xaf\x27\x1c", "archives", True),
+    (0, b"\x1f\x8b", "archives", True),
+    (0, b"BZh", "archives", False),
+    (0, b"\xfd7zXZ\x00", "archives", True),
+    (257, b"ustar", "archives", True),
+    (0, b"PK\x03\x04", "archives", False),
+    (0, b"ID3", "audio", True),
+    (0, b"fLaC", "audio", True),
+    (0, b"OggS", "audio", True),
+    (8, b"WAVE", "audio", True),
+    (8, b"AIFF", "audio", True),
+    (4, b"ftypM4A", "audio", True),
+    (0, b"\xff\xfb", "audio", False),
+    (0, b"\xff\xf3", "audio", False),
+    (0, b"\xff\xf1", "audio", False),
+    (4, b"ftypheic", "images", True),
+    (4, b"ftypheix", "images", True),
+    (4, b"ftypavif", "images", True),
+    (8, b"AVI ", "video", True),
+    (4, b"ftyp", "video", True),
+    (0, b"\x1a\x45\xdf\xa3", "video", True),
+    (0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11", "video", True),
+    (0, b"MZ", "executables", False),
+    (0, b"\x7fELF", "executables", True),
+    (0, b"\xcf\xfa\xed\xfe", "executables", True),
+    (0, b"\xce\xfa\xed\xfe", "executables", True),
+    (0, b"#!", "code", False),
+]
+
+# Office Open XML / OpenDocument files are ZIP archives; these names in the
+# first local file header give them away as documents.
+_ZIP_DOCUMENT_MARKERS = (b"[Content_Types].xml", b"mimetypeapplication/vnd.oasis",
+                         b"word/", b"xl/", b"ppt/")
+
+
+def match_signature(header):
+    """``(category, strong)`` for the first signature ``header`` matches, or None."""
+    for offset, magic, category, strong in SIGNATURES:
+        if header.startswith(magic, offset):
+            if category == "archives" and magic == b"PK\x03\x04":
+                if any(marker in header for marker in _ZIP_DOCUMENT_MARKERS):
+                    return "documents", False
+            return category, strong
+    return None
+
+
+def read_header(path, size=HEADER_SIZE):
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+class ContentSniffer:
+    """Classifies files by their first bytes, remembering results per file identity.
+
+    Results are cached by ``(st_dev, st_ino, st_size, st_mtime_ns)``, which
+    survives a rename, so a preview followed by a real run, or any later run,
+    never reads the same header twice. With a ``cache_path`` the cache is a
+    table in that SQLite file and persists between runs.
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache = {}
+        self._new = []
+        self.reads = 0
+        self.db = None
+        if cache_path is not None:
+            self.db = sqlite3.connect(os.fspath(cache_path))
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                " dev INTEGER NOT NULL, ino INTEGER NOT NULL, size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL, category TEXT NOT NULL, strong INTEGER NOT NULL,"
+                " PRIMARY KEY (dev, ino))")
+
+    def _lookup(self, key):
+        found = self.cache.get(key)
+        if found is None and self.db is not None:
+            row = self.db.execute(
+                "SELECT category, strong FROM signatures"
+                " WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?", key).fetchone()
+            if row is not None:
+                found = self.cache[key] = (row[0], bool(row[1]))
+        return found
+
+    def sniff(self, entry):
+        """``(category, strong)`` for a DirEntry-like object, ``("", False)`` when nothing matched."""
+        try:
+            st = entry.stat()
+        except OSError:
+            return "", False
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        cacheable = st.st_ino != 0
+        if cacheable:
+            found = self._lookup(key)
+            if found is not None:
+                return found
+        try:
+            header = read_header(entry.path)
+        except OSError:
+            return "", False
+        self.reads += 1
+        result = match_signature(header) or ("", False)
+        if cacheable:
+            self.cache[key] = result
+            self._new.append(key + result)
+        return result
+
+    def close(self):
+        """Persist new results and close the cache file."""
+        if self.db is None:
+            return
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO signatures (dev, ino, size, mtime_ns, category, strong)"
+                " VALUES (?, ?, ?, ?, ?, ?)", self._new)
+        self._new = []
+        self.db.close()
+        self.db = None
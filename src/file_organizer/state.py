@@ -0,0 +1,167 @@
+import os
+import sqlite3
+from pathlib import Path
+
+STATE_FILENAME = "scan_state.sqlite3"
+
+# Paths and names are stored as os.fsencode() blobs, so names that are not
+# valid UTF-8 round-trip. Bump SCHEMA_VERSION when the layout changes; older
+# state is dropped (it is only a cache).
+SCHEMA_VERSION = 2
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    root BLOB PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    root BLOB NOT NULL,
+    rel BLOB NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    subdirs BLOB NOT NULL,
+    PRIMARY KEY (root, rel)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    root BLOB NOT NULL,
+    rel BLOB NOT NULL,
+    name BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (root, rel, name)
+);
+"""
+
+# Subdirectory names are stored in one column, separated by a byte that
+# cannot appear in a file name.
+_SEP = b"\0"
+_encode = os.fsencode
+_decode = os.fsdecode
+
+
+def default_state_path(config_path):
+    """The state store lives next to folders_config.json."""
+    return Path(config_path).with_name(STATE_FILENAME)
+
+
+class ScanState:
+    """On-disk memory of earlier scans, used to make recursive rescans incremental.
+
+    For every directory a run listed it keeps the directory's mtime from just
+    before the listing and the names of its subdirectories. A later run only
+    lists a directory again when its mtime changed (files were added, removed
+    or renamed in it); unchanged directories cost a single stat and the walk
+    continues into their known subdirectories. Files that were deliberately
+    left in place are remembered with their size and mtime so a relisting
+    does not look at them again.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.db = sqlite3.connect(str(self.path))
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            with self.db:
+                self.db.executescript("DROP TABLE IF EXISTS roots; DROP TABLE IF EXISTS dirs; "
+                                      "DROP TABLE IF EXISTS entries;")
+                self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.executescript(_SCHEMA)
+
+    def open_root(self, root, fingerprint, full_rescan=False, readonly=False):
+        """State for one root folder; dropped when ``fingerprint`` changed or on a full rescan.
+
+        A ``readonly`` open (used by previews) never deletes anything: stale
+        state is simply ignored.
+        """
+        root = os.path.abspath(os.fspath(root))
+        key = _encode(root)
+        row = self.db.execute("SELECT fingerprint FROM roots WHERE root = ?", (key,)).fetchone()
+        if full_rescan or row is None or row[0] != fingerprint:
+            if readonly:
+                return RootState(self, root, load=False)
+            with self.db:
+                self.db.execute("DELETE FROM dirs WHERE root = ?", (key,))
+                self.db.execute("DELETE FROM entries WHERE root = ?", (key,))
+                self.db.execute("INSERT OR REPLACE INTO roots (root, fingerprint) VALUES (?, ?)",
+                                (key, fingerprint))
+        return RootState(self, root)
+
+    def close(self):
+        self.db.close()
+
+
+class RootState:
+    """Scan state of a single root. Changes are buffered until ``commit``."""
+
+    def __init__(self, store, root, load=True):
+        self.store = store
+        self.root = root
+        self._dirs = {}
+        self._entries = {}
+        if load:
+            db = store.db
+            key = _encode(root)
+            for rel, mtime_ns, subdirs in db.execute(
+                    "SELECT rel, mtime_ns, subdirs FROM dirs WHERE root = ?", (key,)):
+                names = subdirs.split(_SEP) if subdirs else []
+                self._dirs[_decode(rel)] = (mtime_ns, [_decode(name) for name in names])
+            for rel, name, size, mtime_ns in db.execute(
+                    "SELECT rel, name, size, mtime_ns FROM entries WHERE root = ?", (key,)):
+                self._entries.setdefault(_decode(rel), {})[_decode(name)] = (size, mtime_ns)
+        self._listed = {}
+        self._left = {}
+        self._forget = set()
+        self.skipped_dirs = 0
+
+    def unchanged_subdirs(self, rel, mtime_ns):
+        """Known subdirectory names if ``rel`` did not change since it was last listed, else None."""
+        known = self._dirs.get(rel)
+        if known is None or known[0] != mtime_ns:
+            return None
+        self.skipped_dirs += 1
+        return known[1]
+
+    def known_entries(self, rel):
+        """``{name: (size, mtime_ns)}`` of files previously left in place in ``rel``."""
+        return self._entries.get(rel)
+
+    def record_dir(self, rel, mtime_ns, subdirs):
+        if rel in self._forget:
+            # Something in it already failed during this run; list it again next time.
+            return
+        self._listed[rel] = (mtime_ns, subdirs)
+        self._left.setdefault(rel, {})
+
+    def record_entry(self, rel, name, size, mtime_ns):
+        self._left.setdefault(rel, {})[name] = (size, mtime_ns)
+
+    def invalidate(self, rel):
+        """Make the next run list ``rel`` again, e.g. after a move out of it failed."""
+        self._listed.pop(rel, None)
+        self._left.pop(rel, None)
+        self._forget.add(rel)
+
+    def commit(self):
+        """Write everything recorded during the run in one transaction."""
+        db = self.store.db
+        root = _encode(self.root)
+        with db:
+            db.executemany("DELETE FROM dirs WHERE root = ? AND rel = ?",
+                           ((root, _encode(rel)) for rel in self._forget))
+            db.executemany("DELETE FROM entries WHERE root = ? AND rel = ?",
+                           ((root, _encode(rel)) for rel in self._forget | set(self._left)))
+            db.executemany(
+                "INSERT OR REPLACE INTO dirs (root, rel, mtime_ns, subdirs) VALUES (?, ?, ?, ?)",
+                ((root, _encode(rel), mtime_ns, _SEP.join(_encode(name) for name in subdirs))
+                 for rel, (mtime_ns, subdirs) in self._listed.items()))
+            db.executemany(
+                "INSERT OR REPLACE INTO entries (root, rel, name, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                ((root, _encode(rel), _encode(name), size, mtime_ns)
+                 for rel, names in self._left.items()
+                 for name, (size, mtime_ns) in names.items()))
+        for rel in self._forget:
+            self._dirs.pop(rel, None)
+            self._entries.pop(rel, None)
+        self._dirs.update(self._listed)
+        self._entries.update(self._left)
+        # Forgotten folders stay forgotten for the rest of the run, so a
+        # checkpoint between a failure and the end of its folder's listing
+        # cannot mark the folder as done.
+        self._listed, self._left = {}, {}
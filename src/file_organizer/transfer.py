@@ -0,0 +1,221 @@
+import errno
+import os
+import shutil
+import sys
+
+# How a file gets to its category folder. Everything but "move" leaves the
+# source where it is.
+TRANSFER_MODES = ("move", "copy", "hardlink", "symlink", "reflink")
+
+VERBS = {"move": "Moved", "copy": "Copied", "hardlink": "Linked", "symlink": "Symlinked",
+         "reflink": "Cloned"}
+
+# Bytes handed to the kernel per copy call; files larger than one chunk
+# report progress after each.
+COPY_CHUNK = 8 * 1024 * 1024
+# Linux ioctl that makes dst share src's blocks (btrfs, XFS, bcachefs...).
+FICLONE = 0x40049409
+# Modification times closer than this count as equal (FAT stores 2 s steps).
+_MTIME_SLACK_NS = 2 * 10 ** 9
+# Errors meaning "this kernel/filesystem cannot do that", not "the copy failed".
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTTY, errno.EBADF,
+                getattr(errno, "EOPNOTSUPP", errno.EINVAL), getattr(errno, "ENOTSUP", errno.EINVAL)}
+
+
+class VerifyError(OSError):
+    """A copy did not read back identical to its source; the copy was removed."""
+
+
+def _partial_path(dst):
+    # Hidden, so a walk never picks up a half-written copy.
+    head, tail = os.path.split(os.fspath(dst))
+    return os.path.join(head, f".{tail}.part")
+
+
+def _copy_data(src_fd, dst_fd, size, progress):
+    """Copy everything from ``src_fd`` to ``dst_fd`` without passing it through Python where possible."""
+    use_range = hasattr(os, "copy_file_range")
+    use_sendfile = hasattr(os, "sendfile") and sys.platform.startswith("linux")
+    copied = 0
+    while True:
+        if use_range:
+            try:
+                sent = os.copy_file_range(src_fd, dst_fd, COPY_CHUNK)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                # File offsets are left where they were, so the next method just continues.
+                use_range = False
+                continue
+        elif use_sendfile:
+            try:
+                sent = os.sendfile(dst_fd, src_fd, None, COPY_CHUNK)
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED:
+                    raise
+                use_sendfile = False
+                continue
+        else:
+            data = os.read(src_fd, COPY_CHUNK)
+            sent = len(data)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(dst_fd, view):]
+        if not sent:
+            return copied
+        copied += sent
+        if progress is not None and size > COPY_CHUNK:
+            progress(copied, size)
+
+
+def _identical(a, b):
+    from .dedup import full_hash
+    first = full_hash(a)
+    return first is not None and first == full_hash(b)
+
+
+def copy_file(src, dst, progress=None, verify=False, durable=False, clone=False):
+    """Copy ``src`` to ``dst``, which must not exist, keeping its mode and timestamps.
+
+    The data goes to a hidden ``.part`` file next to ``dst`` that is only
+    renamed into place once complete (and, with ``verify``, re-read and
+    compared), so ``dst`` never holds a partial copy. ``durable`` fsyncs it
+    first, for when the source is deleted next. ``clone`` tries a reflink
+    before copying. ``progress(copied, total)`` is called after each chunk
+    of files larger than ``COPY_CHUNK``.
+    """
+    src = os.fspath(src)
+    dst = os.fspath(dst)
+    partial = _partial_path(dst)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    src_fd = os.open(src, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        st = os.fstat(src_fd)
+        try:
+            dst_fd = os.open(partial, flags, st.st_mode & 0o777)
+        except FileExistsError:
+            # Left over from an interrupted copy to this very name.
+            os.unlink(partial)
+            dst_fd = os.open(partial, flags, st.st_mode & 0o777)
+        try:
+            cloned = False
+            if clone:
+                cloned = _clone(src_fd, dst_fd)
+            if not cloned:
+                _copy_data(src_fd, dst_fd, st.st_size, progress)
+            if durable:
+                os.fsync(dst_fd)
+        finally:
+            os.close(dst_fd)
+    except BaseException:
+        os.close(src_fd)
+        _discard(partial)
+        raise
+    os.close(src_fd)
+    try:
+        shutil.copystat(src, partial)
+        if verify and not cloned and not _identical(src, partial):
+            raise VerifyError(errno.EIO, "copy does not match the source", dst)
+        if os.path.lexists(dst):
+            raise FileExistsError(errno.EEXIST, "already exists", dst)
+        os.rename(partial, dst)
+    except BaseException:
+        _discard(partial)
+        raise
+
+
+def _clone(src_fd, dst_fd):
+    """Reflink ``src_fd`` into ``dst_fd``; False when the filesystem cannot."""
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        return False
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def _discard(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def move_file(src, dst, progress=None, verify=False):
+    """Rename ``src`` to ``dst``; across devices, copy it durably (and verified) and then delete it.
+
+    ``dst`` must not exist: a file that appeared there since the name was
+    picked raises FileExistsError instead of being replaced (which a POSIX
+    rename would do silently).
+    """
+    if os.path.lexists(dst):
+        raise FileExistsError(errno.EEXIST, "already exists", os.fspath(dst))
+    try:
+        os.rename(src, dst)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    copy_file(src, dst, progress, verify, durable=True)
+    os.unlink(src)
+
+
+class Transfer:
+    """Carries out one transfer mode; called as ``transfer(src, dst)`` on worker threads.
+
+    ``progress(src, copied, total)`` hears about long copies as they go.
+    """
+
+    def __init__(self, mode="move", verify=False, progress=None):
+        if mode not in TRANSFER_MODES:
+            raise ValueError(f"unknown transfer mode: {mode!r}")
+        self.mode = mode
+        self.verify = verify
+        self.progress = progress
+        self.verb = VERBS[mode]
+
+    @property
+    def keeps_source(self):
+        return self.mode != "move"
+
+    def _progress_for(self, src):
+        if self.progress is None:
+            return None
+        return lambda copied, total: self.progress(src, copied, total)
+
+    def __call__(self, src, dst):
+        mode = self.mode
+        if mode == "move":
+            move_file(src, dst, self._progress_for(src), self.verify)
+        elif mode == "copy":
+            copy_file(src, dst, self._progress_for(src), self.verify)
+        elif mode == "reflink":
+            copy_file(src, dst, self._progress_for(src), self.verify, clone=True)
+        elif mode == "hardlink":
+            os.link(src, dst)
+        else:
+            os.symlink(os.path.abspath(src), dst)
+
+    def already_done(self, src_stat, src, dst):
+        """True when ``dst`` is what an earlier run of this mode made from ``src``."""
+        try:
+            st = os.lstat(dst)
+        except OSError:
+            return False
+        mode = self.mode
+        if mode == "hardlink":
+            return (st.st_dev, st.st_ino) == (src_stat.st_dev, src_stat.st_ino)
+        if mode == "symlink":
+            try:
+                return os.readlink(dst) == os.path.abspath(src)
+            except OSError:
+                return False
+        if mode == "move":
+            return False
+        return (st.st_size == src_stat.st_size
+                and abs(st.st_mtime_ns - src_stat.st_mtime_ns) < _MTIME_SLACK_NS)
@@ -0,0 +1,295 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from .engine import FileEntry, iter_files
+
+# Names browsers and download managers use while a file is still arriving.
+PARTIAL_SUFFIXES = (".part", ".crdownload", ".download", ".partial", ".opdownload", ".tmp")
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct("iIII")
+
+# How often an idle watcher wakes up to check whether it should stop.
+IDLE_WAKEUP = 1.0
+
+
+class InotifySource:
+    """Linux inotify through ctypes; reports paths that were created, written or moved in.
+
+    Raises OSError when inotify is not available, so callers can fall back
+    to ``PollingSource``.
+    """
+
+    def __init__(self, folder, recursive=False, include_hidden=False, skip_roots=()):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.folder = os.fspath(folder)
+        self.recursive = recursive
+        self.include_hidden = include_hidden
+        self.skip_roots = set(skip_roots)
+        self.watches = {}
+        self.overflowed = False
+        self._watch_tree(self.folder)
+
+    def _watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.watches[wd] = path
+
+    def _watch_tree(self, path):
+        self._watch(path)
+        if not self.recursive:
+            return
+        stack = [path]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as listing:
+                    subdirs = [e.path for e in listing
+                               if e.is_dir(follow_symlinks=False) and self._wanted_dir(current, e.name)]
+            except OSError:
+                continue
+            for sub in subdirs:
+                try:
+                    self._watch(sub)
+                except OSError:
+                    continue
+                stack.append(sub)
+
+    def _wanted_dir(self, parent, name):
+        if not self.include_hidden and name.startswith("."):
+            return False
+        return not (parent == self.folder and name in self.skip_roots)
+
+    def fileno(self):
+        return self.fd
+
+    def wait(self, timeout):
+        """Block up to ``timeout`` seconds (None = until something happens); return changed file paths."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            raw_name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; the caller rescans the whole folder.
+                self.overflowed = True
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                self.watches.pop(wd, None)
+                continue
+            parent = self.watches.get(wd)
+            if parent is None or not raw_name:
+                continue
+            path = os.path.join(parent, os.fsdecode(raw_name))
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO) and \
+                        self._wanted_dir(parent, os.path.basename(path)):
+                    try:
+                        self._watch_tree(path)
+                    except OSError:
+                        # Gone again already (a temporary folder of a browser or unpacker).
+                        continue
+                    # Files may have landed before the watch was in place.
+                    paths.extend(entry.path for entry in iter_files(path, True, self.include_hidden))
+                continue
+            paths.append(path)
+        return paths
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingSource:
+    """Portable fallback: rescans the folder every ``interval`` seconds and reports new or changed files."""
+
+    def __init__(self, folder, recursive=False, include_hidden=False, skip_roots=(), interval=5.0):
+        self.folder = os.fspath(folder)
+        self.recursive = recursive
+        self.include_hidden = include_hidden
+        self.skip_roots = set(skip_roots)
+        self.interval = interval
+        self.overflowed = False
+        self._seen = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self):
+        seen = {}
+        for entry in iter_files(self.folder, self.recursive, self.include_hidden, self.skip_roots):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            seen[entry.path] = (st.st_size, st.st_mtime_ns)
+        return seen
+
+    def wait(self, timeout):
+        delay = self._next_scan - time.monotonic()
+        if timeout is not None:
+            delay = min(delay, timeout)
+        if delay > 0:
+            time.sleep(delay)
+        if time.monotonic() < self._next_scan:
+            return []
+        self._next_scan = time.monotonic() + self.interval
+        previous, self._seen = self._seen, self._scan()
+        return [path for path, sig in self._seen.items() if previous.get(path) != sig]
+
+    def close(self):
+        pass
+
+
+def is_partial_download(name):
+    return name.lower().endswith(PARTIAL_SUFFIXES)
+
+
+class FolderWatcher:
+    """Keeps a folder organized: waits for new files and runs them through a FileOrganizer.
+
+    Events are debounced: a file is only organized once no event arrived for
+    it for ``settle`` seconds and its size and mtime did not change since it
+    was first seen (otherwise it waits another ``settle``). Partial downloads
+    are ignored until they are renamed to their final name. Uses inotify on
+    Linux and polling everywhere else (or when ``use_inotify`` is False).
+    """
+
+    def __init__(self, organizer, base_folder, settle=0.5, poll_interval=5.0, use_inotify=True,
+                 stop_event=None):
+        self.organizer = organizer
+        self.base_folder = os.fspath(base_folder)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.stop_event = stop_event or threading.Event()
+        self.pending = {}
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _open_source(self):
+        options = self.organizer.options
+        args = (self.base_folder, options.recursive, options.include_hidden, self.organizer.skip_roots())
+        if self.use_inotify:
+            try:
+                return InotifySource(*args)
+            except (OSError, AttributeError) as e:
+                self.organizer.reporter.log(f"inotify unavailable ({e}); polling every {self.poll_interval:g}s.")
+        return PollingSource(*args, interval=self.poll_interval)
+
+    def _wanted(self, path):
+        name = os.path.basename(path)
+        if is_partial_download(name):
+            return False
+        if name.startswith(".") and not self.organizer.options.include_hidden:
+            return False
+        return True
+
+    def _note(self, paths, now):
+        for path in paths:
+            if not self._wanted(path):
+                continue
+            previous = self.pending.get(path)
+            if previous is not None:
+                self.pending[path] = (now, previous[1])
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            self.pending[path] = (now, (st.st_size, st.st_mtime_ns))
+
+    def _ready(self, now):
+        """Paths that have been quiet for ``settle`` seconds and stopped growing."""
+        ready = []
+        for path, (last_event, last_sig) in list(self.pending.items()):
+            if now - last_event < self.settle:
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self.pending[path]
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if sig == last_sig:
+                del self.pending[path]
+                ready.append(path)
+            else:
+                self.pending[path] = (now, sig)
+        return ready
+
+    def run(self):
+        """Organize what is already there, then watch until ``stop()`` is called."""
+        reporter = self.organizer.reporter
+        # Subscribe first so nothing that lands during the initial pass is missed.
+        source = self._open_source()
+        self.organizer.run(self.base_folder)
+        kind = "inotify" if isinstance(source, InotifySource) else "polling"
+        reporter.log(f"Watching {self.base_folder} for new files ({kind})...")
+        reporter.status("Watching for new files")
+        journal_dir = self.organizer.options.journal_dir
+        if journal_dir and not self.organizer.options.preview:
+            # One journal for everything organized while watching, so a stream
+            # of downloads cannot push earlier runs out of the kept journals.
+            from .journal import open_journal
+            self.organizer.journal = open_journal(journal_dir, self.base_folder, reporter.log)
+        try:
+            while not self.stop_event.is_set():
+                timeout = min(self.settle, IDLE_WAKEUP) if self.pending else IDLE_WAKEUP
+                paths = source.wait(timeout)
+                now = time.monotonic()
+                if source.overflowed:
+                    source.overflowed = False
+                    paths = [entry.path for entry in self.organizer.iter_files(self.base_folder)]
+                self._note(paths, now)
+                ready = self._ready(now)
+                if ready:
+                    self.organizer.run(self.base_folder, [FileEntry(path) for path in ready])
+                    reporter.status("Watching for new files")
+        finally:
+            source.close()
+            journal = self.organizer.journal
+            if journal is not None:
+                self.organizer.journal = None
+                journal.close()
+        reporter.log("Stopped watching.")
+        reporter.status("Ready")
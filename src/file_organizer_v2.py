@@ -1,87 +1,127 @@
-import os
-import json
-import sys
+from collections import deque
+import logging
+import multiprocessing
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
 
+from file_organizer import (
+    DEFAULT_FOLDERS,
+    ExtensionClassifier,
+    FileOrganizer,
+    FolderWatcher,
+    OrganizeOptions,
+    Reporter,
+    RunControl,
+    default_config_path,
+    default_journal_dir,
+    default_state_path,
+    format_report,
+    latest_journal,
+    load_config,
+    normalize_extensions,
+    save_config,
+    undo_journal,
+)
+from file_organizer.batch import BatchRunner, load_batch
+from file_organizer.dedup import DEDUP_MODES
+from file_organizer.plan import MovePlan
+from file_organizer.shard import SHARD_MODES
+from file_organizer.transfer import TRANSFER_MODES
+
+
+# How often the UI drains worker events, and how many log lines stay on screen.
+UI_TICK_MS = 100
+LOG_MAX_LINES = 5000
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+
+class AppReporter(Reporter):
+    """Forwards engine events to the app's thread-safe log/status/progress channel."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def log(self, message):
+        self.app.log_message(message)
+
+    def status(self, message):
+        self.app.set_status(message)
+
+    def progress(self, processed, total):
+        self.app.update_progress(processed, total)
+
+
 class FileOrganizerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("File Organizer")
-        self.root.geometry("780x720")
+        self.root.geometry("880x720")
         self.root.resizable(True, True)
         self.accent_color = "#4f8ef7"
         self.theme = "light"
-        self.config_path = self._get_config_path()
-        self.default_folders = {
-            "images": ["jpg", "jpeg", "png", "gif", "bmp", "tiff", "webp"],
-            "documents": ["txt", "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx"],
-            "archives": ["zip", "rar", "tar", "gz", "7z"],
-            "audio": ["mp3", "wav", "flac", "aac", "ogg"],
-            "video": ["mp4", "avi", "mkv", "mov", "wmv"],
-            "code": ["py", "js", "html", "css", "java", "cpp", "c", "php"],
-            "executables": ["exe", "msi", "app", "bat"]
-        }
+        self.config_path = default_config_path()
+        self.default_folders = dict(DEFAULT_FOLDERS)
+        self.settings = {}
+        self.classifier = None
+        self.watch_stop = None
+        # Moves decided by the last preview (or loaded from a file), ready to apply.
+        self.last_plan = None
+        # Pause/cancel handle of the job that is running, if any.
+        self.run_control = None
+        # Worker -> UI channel: log lines queue up (bounded), status and
+        # progress only keep their latest value until the next UI tick.
+        self.pending_log = deque(maxlen=LOG_MAX_LINES)
+        self.pending_lock = threading.Lock()
+        self.pending_status = None
+        self.pending_progress = None
+        self.file_log = self._open_file_log()
         self.folders = self.load_folders_config()
         
         self.apply_style()
         self.setup_ui()
         self.apply_theme(self.theme)
+        self.root.after(UI_TICK_MS, self.drain_events)
 
-    def _get_config_path(self):
-        if getattr(sys, "frozen", False):
-            appdata = os.getenv("APPDATA")
-            if appdata:
-                base = Path(appdata) / "FileOrganizer"
-            else:
-                base = Path.home() / ".config" / "FileOrganizer"
-            base.mkdir(parents=True, exist_ok=True)
-            return base / "folders_config.json"
-        return Path(__file__).with_name("folders_config.json")
-        
-    def _normalize_extensions(self, extensions):
-        cleaned = []
-        seen = set()
-        for ext in extensions:
-            if not isinstance(ext, str):
-                continue
-            norm = ext.strip().lstrip('.').lower()
-            if not norm or norm in seen:
-                continue
-            seen.add(norm)
-            cleaned.append(norm)
-        return cleaned
+    def _open_file_log(self):
+        """Full log, rotated on disk next to the config; the on-screen log is only a tail."""
+        logger = logging.getLogger("file_organizer.gui")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            try:
+                handler = RotatingFileHandler(self.config_path.with_name("file_organizer.log"),
+                                              maxBytes=LOG_FILE_MAX_BYTES,
+                                              backupCount=LOG_FILE_BACKUPS, encoding="utf-8")
+            except OSError:
+                handler = logging.NullHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            logger.addHandler(handler)
+        return logger
 
     def load_folders_config(self):
-        if self.config_path.exists():
-            try:
-                with self.config_path.open("r", encoding="utf-8") as f:
-                    data = json.load(f)
-                if isinstance(data, dict):
-                    # Load theme preference if present
-                    if "_theme" in data:
-                        self.theme = data["_theme"]
-                    # Load folders
-                    cleaned = {}
-                    for name, exts in data.items():
-                        if name == "_theme" or not isinstance(name, str) or not isinstance(exts, list):
-                            continue
-                        cleaned[name] = self._normalize_extensions(exts)
-                    if cleaned:
-                        return cleaned
-            except Exception:
-                # Fall back to defaults on any load issue
-                pass
-        return dict(self.default_folders)
+        folders, settings = load_config(self.config_path, self.default_folders)
+        # Load theme preference if present
+        if "_theme" in settings:
+            self.theme = settings["_theme"]
+        self.settings = settings
+        self.rebuild_classifier(folders)
+        return folders
+
+    def rebuild_classifier(self, folders=None):
+        """Recompile the extension index and rules; call whenever the category mapping changes."""
+        self.classifier = ExtensionClassifier(self.folders if folders is None else folders,
+                                              self.settings.get("_rules"))
+        for message in self.classifier.conflict_messages():
+            self.log_message(message)
 
     def save_folders_config(self):
         try:
-            payload: dict = {name: sorted(exts) for name, exts in self.folders.items()}
-            payload["_theme"] = self.theme
-            with self.config_path.open("w", encoding="utf-8") as f:
-                json.dump(payload, f, indent=2)
+            self.settings["_theme"] = self.theme
+            save_config(self.config_path, self.folders, self.settings)
             self.log_message(f"Saved categories and theme to {self.config_path}")
         except Exception as e:
             self.log_message(f"Could not save config: {e}")
@@ -174,6 +214,16 @@ class FileOrganizerApp:
         self.recursive_var = tk.BooleanVar(value=False)
         self.backup_first_var = tk.BooleanVar(value=False)
         self.dark_mode_var = tk.BooleanVar(value=self.theme == "dark")
+        self.workers_var = tk.StringVar(value="1")
+        self.incremental_var = tk.BooleanVar(value=False)
+        self.full_rescan_var = tk.BooleanVar(value=False)
+        self.watch_var = tk.BooleanVar(value=False)
+        self.sniff_var = tk.BooleanVar(value=False)
+        self.network_var = tk.BooleanVar(value=False)
+        self.transfer_var = tk.StringVar(value="move")
+        self.verify_var = tk.BooleanVar(value=False)
+        self.dedup_var = tk.StringVar(value="off")
+        self.shard_var = tk.StringVar(value=str(self.settings.get("_shard") or "off"))
         
         ttk.Checkbutton(options_frame, text="Create missing folders automatically", 
                        variable=self.create_folders_var).grid(row=0, column=0, sticky=tk.W)
@@ -183,8 +233,37 @@ class FileOrganizerApp:
                        variable=self.recursive_var).grid(row=2, column=0, sticky=tk.W)
         ttk.Checkbutton(options_frame, text="Preview (no changes)", 
                        variable=self.backup_first_var).grid(row=3, column=0, sticky=tk.W)
+        ttk.Checkbutton(options_frame, text="Incremental rescan (skip folders unchanged since the last run)", 
+                       variable=self.incremental_var).grid(row=4, column=0, sticky=tk.W)
+        ttk.Checkbutton(options_frame, text="Full rescan (rebuild the incremental cache)", 
+                       variable=self.full_rescan_var).grid(row=5, column=0, sticky=tk.W)
+        ttk.Checkbutton(options_frame, text="Watch folder (keep organizing new files as they arrive)", 
+                       variable=self.watch_var).grid(row=6, column=0, sticky=tk.W)
+        ttk.Checkbutton(options_frame, text="Detect type from file contents when the extension is unknown", 
+                       variable=self.sniff_var).grid(row=7, column=0, sticky=tk.W)
+        ttk.Checkbutton(options_frame, text="Network share mode (keep many file operations in flight)", 
+                       variable=self.network_var).grid(row=8, column=0, sticky=tk.W)
+        workers_row = ttk.Frame(options_frame, style="Main.TFrame")
+        workers_row.grid(row=9, column=0, sticky=tk.W, pady=(4, 0))
+        ttk.Label(workers_row, text="Parallel moves:").pack(side=tk.LEFT)
+        ttk.Combobox(workers_row, textvariable=self.workers_var, width=4, state="readonly",
+                     values=[str(n) for n in (1, 2, 4, 8, 16, 32)]).pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Label(workers_row, text="Duplicates:").pack(side=tk.LEFT, padx=(16, 0))
+        ttk.Combobox(workers_row, textvariable=self.dedup_var, width=9, state="readonly",
+                     values=list(DEDUP_MODES)).pack(side=tk.LEFT, padx=(6, 0))
+        # Not read-only: "date:%Y" or "count:500" can be typed in.
+        ttk.Label(workers_row, text="Subfolders:").pack(side=tk.LEFT, padx=(16, 0))
+        ttk.Combobox(workers_row, textvariable=self.shard_var, width=10,
+                     values=list(SHARD_MODES)).pack(side=tk.LEFT, padx=(6, 0))
+        transfer_row = ttk.Frame(options_frame, style="Main.TFrame")
+        transfer_row.grid(row=10, column=0, sticky=tk.W, pady=(4, 0))
+        ttk.Label(transfer_row, text="Transfer:").pack(side=tk.LEFT)
+        ttk.Combobox(transfer_row, textvariable=self.transfer_var, width=8, state="readonly",
+                     values=list(TRANSFER_MODES)).pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Checkbutton(transfer_row, text="Verify copies before deleting sources",
+                        variable=self.verify_var).pack(side=tk.LEFT, padx=(16, 0))
         ttk.Checkbutton(options_frame, text="Dark mode", 
-                       variable=self.dark_mode_var, command=self.toggle_theme).grid(row=4, column=0, sticky=tk.W)
+                       variable=self.dark_mode_var, command=self.toggle_theme).grid(row=11, column=0, sticky=tk.W)
         
         # Categories frame
         categories_frame = ttk.LabelFrame(main_frame, text="Categories", padding="12", style="Card.TLabelframe")
@@ -247,6 +326,27 @@ class FileOrganizerApp:
         self.organize_btn = ttk.Button(button_frame, text="Organize Files", 
                                       command=self.start_organization, style="Accent.TButton")
         self.organize_btn.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.pause_btn = ttk.Button(button_frame, text="Pause", command=self.toggle_pause,
+                                    state=tk.DISABLED)
+        self.pause_btn.pack(side=tk.LEFT, padx=(0, 10))
+        self.cancel_btn = ttk.Button(button_frame, text="Cancel", command=self.cancel_run,
+                                     state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.apply_btn = ttk.Button(button_frame, text="Apply Plan", command=self.start_apply_plan,
+                                    state=tk.DISABLED)
+        self.apply_btn.pack(side=tk.LEFT, padx=(0, 10))
+        self.save_plan_btn = ttk.Button(button_frame, text="Save Plan...", command=self.save_plan,
+                                        state=tk.DISABLED)
+        self.save_plan_btn.pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Load Plan...",
+                   command=self.load_plan).pack(side=tk.LEFT, padx=(0, 10))
+        self.batch_btn = ttk.Button(button_frame, text="Run Batch...", command=self.start_batch)
+        self.batch_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.undo_btn = ttk.Button(button_frame, text="Undo Last Run", command=self.start_undo)
+        self.undo_btn.pack(side=tk.LEFT, padx=(0, 10))
         
         ttk.Button(button_frame, text="Clear Log", 
                   command=self.clear_log).pack(side=tk.LEFT, padx=(0, 10))
@@ -271,20 +371,53 @@ class FileOrganizerApp:
             self.folder_var.set(folder)
     
     def log_message(self, message):
-        def append():
-            self.log_text.insert(tk.END, message + "\n")
-            self.log_text.see(tk.END)
-        self.root.after(0, append)
+        self.file_log.info(message)
+        self.pending_log.append(message)
 
     def set_status(self, message):
-        self.root.after(0, lambda: self.status_var.set(message))
+        with self.pending_lock:
+            self.pending_status = message
 
     def update_progress(self, processed, total):
-        if total <= 0:
-            self.root.after(0, lambda: self.progress_var.set(0))
+        with self.pending_lock:
+            self.pending_progress = (processed, total)
+
+    def drain_events(self):
+        """Apply everything the worker reported since the last tick, then reschedule."""
+        lines = []
+        try:
+            while True:
+                lines.append(self.pending_log.popleft())
+        except IndexError:
+            pass
+        if lines:
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            line_count = int(self.log_text.index("end-1c").split(".")[0]) - 1
+            if line_count > LOG_MAX_LINES:
+                self.log_text.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
+            self.log_text.see(tk.END)
+
+        with self.pending_lock:
+            status, self.pending_status = self.pending_status, None
+            progress, self.pending_progress = self.pending_progress, None
+        if status is not None:
+            self.status_var.set(status)
+        if progress is not None:
+            self._apply_progress(*progress)
+        self.root.after(UI_TICK_MS, self.drain_events)
+
+    def _apply_progress(self, processed, total):
+        indeterminate = str(self.progress_bar.cget("mode")) == "indeterminate"
+        if total is None:
+            # Still discovering files: animate instead of showing a percentage.
+            if not indeterminate:
+                self.progress_bar.config(mode="indeterminate")
+                self.progress_bar.start(50)
             return
-        percent = min(100, (processed / total) * 100)
-        self.root.after(0, lambda: self.progress_var.set(percent))
+        if indeterminate:
+            self.progress_bar.stop()
+            self.progress_bar.config(mode="determinate")
+        self.progress_var.set(0 if total <= 0 else min(100, (processed / total) * 100))
     
     def toggle_theme(self):
         theme = "dark" if self.dark_mode_var.get() else "light"
@@ -324,11 +457,12 @@ class FileOrganizerApp:
         if not name:
             self.log_message("Category name cannot be empty.")
             return
-        exts = self._normalize_extensions(self.extensions_var.get().split(","))
+        exts = normalize_extensions(self.extensions_var.get().split(","))
         if not exts:
             self.log_message("Provide at least one extension.")
             return
         self.folders[name] = exts
+        self.rebuild_classifier()
         self.refresh_category_list()
         self.select_category(name)
         self.log_message(f"Saved category '{name}' with {len(exts)} extensions.")
@@ -342,168 +476,252 @@ class FileOrganizerApp:
         name = self.categories_listbox.get(selection[0])
         if name in self.folders:
             del self.folders[name]
+            self.rebuild_classifier()
             self.refresh_category_list()
             self.log_message(f"Deleted category '{name}'.")
             self.save_folders_config()
 
     def restore_default_categories(self):
         self.folders = dict(self.default_folders)
+        self.rebuild_classifier()
         self.refresh_category_list()
         self.save_folders_config()
         self.log_message("Restored default categories.")
 
-    def _unique_destination(self, dest_dir: Path, original_name: str) -> Path:
-        target = dest_dir / original_name
-        if not target.exists():
-            return target
-        stem = Path(original_name).stem
-        suffix = Path(original_name).suffix
-        counter = 1
-        while True:
-            candidate = dest_dir / f"{stem} ({counter}){suffix}"
-            if not candidate.exists():
-                return candidate
-            counter += 1
-
-    def _collect_files_to_organize(self, base_folder: Path):
-        """Files to process: top-level only, or all nested files except under category/others folders."""
-        skip_roots = set(self.folders.keys()) | {"others"}
-        include_hidden = self.include_hidden_var.get()
-
-        def include_file(path: Path) -> bool:
-            if path.name.startswith(".") and not include_hidden:
-                return False
-            return True
-
-        if not self.recursive_var.get():
-            return [p for p in base_folder.iterdir() if p.is_file() and include_file(p)]
-
-        out = []
-        for path in base_folder.rglob("*"):
-            if not path.is_file():
-                continue
-            if not include_file(path):
-                continue
-            try:
-                rel = path.relative_to(base_folder)
-            except ValueError:
-                continue
-            if rel.parts and rel.parts[0] in skip_roots:
-                continue
-            out.append(path)
-        return out
-    
     def clear_log(self):
         self.log_text.delete(1.0, tk.END)
     
-    def organize_files(self):
+    def current_options(self):
+        use_state = self.incremental_var.get() or self.full_rescan_var.get()
+        return OrganizeOptions(
+            recursive=self.recursive_var.get(),
+            include_hidden=self.include_hidden_var.get(),
+            preview=self.backup_first_var.get(),
+            create_folders=self.create_folders_var.get(),
+            workers=int(self.workers_var.get() or 1),
+            state_path=default_state_path(self.config_path) if use_state else None,
+            full_rescan=self.full_rescan_var.get(),
+            journal_dir=default_journal_dir(),
+            sniff="unknown" if self.sniff_var.get() else "off",
+            pipeline="async" if self.network_var.get() else "sync",
+            transfer=self.transfer_var.get(),
+            verify=self.verify_var.get(),
+            sniff_cache_path=default_state_path(self.config_path),
+            dedup=self.dedup_var.get(),
+            shard=self.shard_var.get().strip() or "off",
+            # A preview keeps its moves so "Apply Plan" does not have to scan again.
+            record_plan=self.backup_first_var.get(),
+        )
+
+    def organize_files(self, options, folder, watch=False, plan=None):
         try:
-            base_folder = Path(self.folder_var.get())
-            
-            if not base_folder.exists():
-                self.log_message("Error: Selected folder does not exist!")
-                self.set_status("Error occurred")
-                return
-            
-            mode = "recursive" if self.recursive_var.get() else "top-level only"
-            self.log_message(f"Starting organization of: {base_folder} ({mode})")
-            
-            all_files = self._collect_files_to_organize(base_folder)
-            
-            total_files = len(all_files)
-            processed_files = 0
-            
-            if total_files == 0:
-                self.log_message("No files to process.")
-                self.set_status("Ready")
-                self.update_progress(0, 1)
-                return
-
-            self.log_message(f"Found {total_files} files to process...")
-            self.update_progress(0, total_files)
-            
-            for item in all_files:
-                src_label = str(item.relative_to(base_folder))
-                ext = item.suffix.lower().lstrip('.')
-                moved = False
-                
-                # Determine which category folder to use
-                for folder, ext_list in self.folders.items():
-                    if ext in ext_list:
-                        dest_dir = base_folder / folder
-                        if self.create_folders_var.get():
-                            dest_dir.mkdir(exist_ok=True)
-                        
-                        if dest_dir.exists():
-                            target_path = self._unique_destination(dest_dir, item.name)
-                            if self.backup_first_var.get():
-                                self.log_message(f"[PREVIEW] {src_label} → {target_path.relative_to(base_folder)}")
-                                moved = True
-                            else:
-                                try:
-                                    item.rename(target_path)
-                                    self.log_message(f"Moved: {src_label} → {target_path.relative_to(base_folder)}")
-                                    moved = True
-                                except Exception as e:
-                                    self.log_message(f"Error moving {src_label}: {str(e)}")
-                                    moved = True
-                        else:
-                            self.log_message(f"Destination folder doesn't exist: {dest_dir}")
-                        break
-                
-                # If extension didn't match any category, move to "others"
-                if not moved:
-                    dest_dir = base_folder / "others"
-                    if self.create_folders_var.get():
-                        dest_dir.mkdir(exist_ok=True)
-                    
-                    if dest_dir.exists():
-                        target_path = self._unique_destination(dest_dir, item.name)
-                        if self.backup_first_var.get():
-                            self.log_message(f"[PREVIEW] {src_label} → {target_path.relative_to(base_folder)}")
-                        else:
-                            try:
-                                item.rename(target_path)
-                                self.log_message(f"Moved: {src_label} → {target_path.relative_to(base_folder)}")
-                            except Exception as e:
-                                self.log_message(f"Error moving {src_label}: {str(e)}")
-                    else:
-                        self.log_message(f"Destination folder doesn't exist: {dest_dir}")
-                    
-                    processed_files += 1
-                    self.update_progress(processed_files, total_files)
-                    self.set_status(f"Processing... {processed_files}/{total_files} files")
-            
-            if self.backup_first_var.get():
-                self.log_message("Preview complete. No files were moved.")
-                self.set_status("Preview complete")
+            organizer = FileOrganizer(dict(self.folders), options, AppReporter(self),
+                                      classifier=self.classifier, control=self.run_control)
+            if watch:
+                FolderWatcher(organizer, folder, stop_event=self.watch_stop).run()
             else:
-                self.log_message(f"Organization complete! Processed {processed_files} files.")
-                self.set_status("Ready")
-            
+                summary = organizer.run(folder, plan=plan)
+                if plan is not None:
+                    self.last_plan = None
+                elif organizer.plan is not None and len(organizer.plan):
+                    self.last_plan = organizer.plan
+                    self.log_message(f"Plan of {len(organizer.plan)} moves kept; "
+                                     "click Apply Plan to carry it out without scanning again.")
+                if summary.get("processed"):
+                    for line in format_report(summary["metrics"]):
+                        self.log_message(line)
         except Exception as e:
             self.log_message(f"Error: {str(e)}")
             self.set_status("Error occurred")
     
     def start_organization(self):
-        # Disable button during processing
-        self.organize_btn.config(state=tk.DISABLED)
+        if self.watch_stop is not None:
+            # The button reads "Stop Watching" while a watch is running.
+            self.watch_stop.set()
+            self.organize_btn.config(state=tk.DISABLED)
+            self.set_status("Stopping...")
+            return
+
+        watch = self.watch_var.get()
+        if watch:
+            self.watch_stop = threading.Event()
+            self.organize_btn.config(text="Stop Watching")
+        else:
+            # Disable button during processing
+            self.organize_btn.config(state=tk.DISABLED)
+        self.undo_btn.config(state=tk.DISABLED)
+        self.apply_btn.config(state=tk.DISABLED)
+        self.save_plan_btn.config(state=tk.DISABLED)
+        self.batch_btn.config(state=tk.DISABLED)
+        self.start_run_control()
         self.progress_var.set(0)
         self.set_status("Processing...")
         
         # Run organization in separate thread to prevent UI freezing
-        thread = threading.Thread(target=self._run_organization_worker)
+        thread = threading.Thread(target=self._run_organization_worker,
+                                  args=(self.current_options(), Path(self.folder_var.get()), watch))
         thread.daemon = True
         thread.start()
 
-    def _run_organization_worker(self):
-        self.organize_files()
+    def _run_organization_worker(self, options, folder, watch):
+        self.organize_files(options, folder, watch)
         self.root.after(0, self.on_organization_complete)
 
+    def start_run_control(self):
+        self.run_control = RunControl()
+        self.pause_btn.config(text="Pause", state=tk.NORMAL)
+        self.cancel_btn.config(state=tk.NORMAL)
+
+    def toggle_pause(self):
+        control = self.run_control
+        if control is None:
+            return
+        if control.paused:
+            control.resume()
+            self.pause_btn.config(text="Pause")
+            self.set_status("Processing...")
+        else:
+            # Takes effect after the current chunk of files.
+            control.pause()
+            self.pause_btn.config(text="Resume")
+            self.set_status("Pausing...")
+
+    def cancel_run(self):
+        if self.run_control is None:
+            return
+        self.run_control.cancel()
+        if self.watch_stop is not None:
+            self.watch_stop.set()
+        self.pause_btn.config(state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.set_status("Cancelling...")
+
     def on_organization_complete(self):
-        self.organize_btn.config(state=tk.NORMAL)
+        self.run_control = None
+        self.pause_btn.config(text="Pause", state=tk.DISABLED)
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.watch_stop = None
+        self.organize_btn.config(text="Organize Files", state=tk.NORMAL)
+        self.undo_btn.config(state=tk.NORMAL)
+        self.batch_btn.config(state=tk.NORMAL)
+        self.update_plan_buttons()
+
+    def update_plan_buttons(self):
+        state = tk.NORMAL if self.last_plan is not None else tk.DISABLED
+        self.apply_btn.config(state=state)
+        self.save_plan_btn.config(state=state)
+
+    def start_apply_plan(self):
+        plan = self.last_plan
+        if plan is None:
+            return
+        if not messagebox.askyesno("Apply Plan", f"Move {len(plan)} files in {plan.root} as planned?"):
+            return
+        options = self.current_options()
+        options.preview = False
+        options.record_plan = False
+        for button in (self.organize_btn, self.undo_btn, self.apply_btn, self.save_plan_btn,
+                       self.batch_btn):
+            button.config(state=tk.DISABLED)
+        self.start_run_control()
+        self.progress_var.set(0)
+        self.set_status("Processing...")
+        thread = threading.Thread(target=self._run_apply_worker, args=(options, plan))
+        thread.daemon = True
+        thread.start()
+
+    def _run_apply_worker(self, options, plan):
+        self.organize_files(options, plan.root, plan=plan)
+        self.root.after(0, self.on_organization_complete)
+
+    def start_batch(self):
+        path = filedialog.askopenfilename(title="Run Batch",
+                                          filetypes=[("Batch files", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            jobs, batch_settings = load_batch(path)
+        except (OSError, ValueError) as e:
+            self.log_message(f"Error loading batch: {str(e)}")
+            return
+        for button in (self.organize_btn, self.undo_btn, self.apply_btn, self.save_plan_btn,
+                       self.batch_btn):
+            button.config(state=tk.DISABLED)
+        self.start_run_control()
+        self.progress_var.set(0)
+        self.set_status("Processing...")
+        # The options above are the defaults for every folder of the batch.
+        thread = threading.Thread(target=self._run_batch_worker,
+                                  args=(self.current_options(), jobs, batch_settings))
+        thread.daemon = True
+        thread.start()
+
+    def _run_batch_worker(self, options, jobs, batch_settings):
+        try:
+            BatchRunner(dict(self.folders), self.settings, options, jobs, AppReporter(self),
+                        self.run_control, **batch_settings).run()
+        except Exception as e:
+            self.log_message(f"Error: {str(e)}")
+            self.set_status("Error occurred")
+        self.root.after(0, self.on_organization_complete)
+
+    def save_plan(self):
+        if self.last_plan is None:
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".jsonl",
+                                            filetypes=[("JSON Lines", "*.jsonl"), ("CSV", "*.csv")])
+        if not path:
+            return
+        try:
+            self.last_plan.save(path)
+            self.log_message(f"Saved a plan of {len(self.last_plan)} moves to {path}")
+        except OSError as e:
+            self.log_message(f"Error saving plan: {str(e)}")
+
+    def load_plan(self):
+        path = filedialog.askopenfilename(filetypes=[("Move plans", "*.jsonl *.csv"),
+                                                     ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            # CSV plans do not record their folder; they apply to the selected one.
+            root = self.folder_var.get() if path.lower().endswith(".csv") else None
+            self.last_plan = MovePlan.load(path, root)
+        except (OSError, ValueError, KeyError) as e:
+            self.log_message(f"Error loading plan: {str(e)}")
+            return
+        self.log_message(f"Loaded a plan of {len(self.last_plan)} moves for {self.last_plan.root}")
+        self.update_plan_buttons()
+
+    def start_undo(self):
+        journal = latest_journal(default_journal_dir())
+        if journal is None:
+            self.log_message("Nothing to undo: no move journal found.")
+            return
+        if not messagebox.askyesno("Undo Last Run",
+                                   f"Move the files recorded in {journal.name} back where they came from?"):
+            return
+        for button in (self.organize_btn, self.undo_btn, self.apply_btn, self.save_plan_btn,
+                       self.batch_btn):
+            button.config(state=tk.DISABLED)
+        self.progress_var.set(0)
+        self.set_status("Undoing...")
+        workers = int(self.workers_var.get() or 1)
+        thread = threading.Thread(target=self._run_undo_worker, args=(journal, workers))
+        thread.daemon = True
+        thread.start()
+
+    def _run_undo_worker(self, journal, workers):
+        try:
+            undo_journal(journal, workers, reporter=AppReporter(self))
+        except Exception as e:
+            self.log_message(f"Error: {str(e)}")
+            self.set_status("Error occurred")
+        self.root.after(0, self.on_organization_complete)
 
 def main():
+    # Duplicate hashing uses worker processes; needed when running as a frozen .exe.
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = FileOrganizerApp(root)
     root.mainloop()
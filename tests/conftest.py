@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from file_organizer import DEFAULT_FOLDERS, FileOrganizer, OrganizeOptions
+
+
+def make_files(folder, *names, content=b"x"):
+    """Create ``names`` (relative paths) under ``folder`` and return their paths."""
+    paths = []
+    for name in names:
+        path = os.path.join(os.fspath(folder), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content if isinstance(content, bytes) else content.encode())
+        paths.append(path)
+    return paths
+
+
+def listing(folder):
+    """Every file under ``folder`` as a sorted list of '/'-separated relative paths."""
+    found = []
+    for dirpath, _dirnames, filenames in os.walk(os.fspath(folder)):
+        rel = os.path.relpath(dirpath, os.fspath(folder))
+        for name in filenames:
+            found.append(name if rel == os.curdir else f"{rel}/{name}".replace(os.sep, "/"))
+    return sorted(found)
+
+
+@pytest.fixture
+def organize():
+    """Run a FileOrganizer with the default folders and the given options."""
+    def run(folder, **options):
+        return FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(**options)).run(folder)
+    return run
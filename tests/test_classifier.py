@@ -0,0 +1,13 @@
+from file_organizer import DEFAULT_FOLDERS, ExtensionClassifier
+
+
+def test_match_uses_rules_and_multi_part_extensions():
+    folders = dict(DEFAULT_FOLDERS, backups=["tar.gz"])
+    classifier = ExtensionClassifier(folders, [{"glob": "invoice_*.pdf", "category": "invoices"}])
+
+    assert classifier.match("photo.JPG") == ("images", True)
+    assert classifier.match("site.tar.gz") == ("backups", True)
+    assert classifier.match("notes.gz") == ("archives", True)
+    assert classifier.match("invoice_2026.pdf") == ("invoices", True)
+    assert classifier.match("README") == ("others", False)
+    assert "invoices" in classifier.categories
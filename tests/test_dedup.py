@@ -0,0 +1,23 @@
+import os
+
+from conftest import listing, make_files
+
+from file_organizer import undo_journal
+
+
+def test_dedup_hardlinks_duplicates(tmp_path, organize):
+    root = tmp_path / "in"
+    make_files(root, "a.txt", "b.txt", content=b"same")
+    make_files(root, "c.txt", content=b"different")
+
+    summary = organize(root, dedup="hardlink", journal_dir=tmp_path / "journals")
+
+    assert summary["duplicates"] == 1 and summary["errors"] == 0
+    docs = root / "documents"
+    assert listing(root) == ["documents/a.txt", "documents/b.txt", "documents/c.txt"]
+    assert os.path.samefile(docs / "a.txt", docs / "b.txt")
+    assert not os.path.samefile(docs / "a.txt", docs / "c.txt")
+
+    undo_journal(summary["journal"])
+    assert listing(root) == ["a.txt", "b.txt", "c.txt"]
+    assert (root / "b.txt").read_bytes() == b"same"
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from file_organizer import MoveExecutor, WorkerPool
+
+
+def test_busy_device_does_not_delay_other_devices():
+    executor = MoveExecutor(workers=4, per_device=1)
+    release = threading.Event()
+    finished = {}
+
+    def slow(name):
+        release.wait(5)
+        finished[name] = time.monotonic()
+
+    def fast(name):
+        finished[name] = time.monotonic()
+
+    for n in range(4):
+        executor.submit("A", slow, f"a{n}", context=f"a{n}")
+    started = time.monotonic()
+    for n in range(4):
+        executor.submit("B", fast, f"b{n}", context=f"b{n}")
+    deadline = started + 2
+    while len([name for name in finished if name.startswith("b")]) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    outcomes = executor.finish()
+
+    assert [context for context, _error in outcomes] == [f"a{n}" for n in range(4)] + [
+        f"b{n}" for n in range(4)]
+    assert all(error is None for _context, error in outcomes)
+    assert all(finished[f"b{n}"] - started < 1 for n in range(4))
+
+
+def test_per_device_limit_holds():
+    executor = MoveExecutor(workers=4, per_device=2)
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def call():
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    for n in range(12):
+        executor.submit("A", call, context=n)
+    outcomes = executor.finish()
+
+    assert [context for context, _error in outcomes] == list(range(12))
+    assert running[1] == 2
+
+
+def test_shared_pool_lanes():
+    pool = WorkerPool(2)
+    try:
+        executors = [MoveExecutor(pool=pool) for _ in range(2)]
+        for index, executor in enumerate(executors):
+            for n in range(5):
+                executor.submit(index, lambda: None, context=(index, n))
+        for index, executor in enumerate(executors):
+            assert [context for context, _ in executor.finish()] == [(index, n) for n in range(5)]
+    finally:
+        pool.shutdown()
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+from conftest import listing, make_files
+
+from file_organizer import DEFAULT_FOLDERS, FileOrganizer, OrganizeOptions, Reporter, RunControl
+
+
+class CancelAfter(Reporter):
+    def __init__(self, control, moves):
+        self.control = control
+        self.moves = moves
+
+    def log(self, message):
+        if message.startswith("Moved"):
+            self.moves -= 1
+            if self.moves == 0:
+                self.control.cancel()
+
+
+@pytest.mark.parametrize("pipeline", ["sync", "async"])
+def test_cancelled_run_leaves_unfinished_folders_to_rescan(tmp_path, pipeline):
+    root = tmp_path / "in"
+    make_files(root, *(f"d{d}/f{i}.txt" for d in range(12) for i in range(50)))
+    options = dict(recursive=True, pipeline=pipeline, state_path=tmp_path / "state.sqlite3")
+    control = RunControl()
+    first = FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(**options), CancelAfter(control, 100),
+                          control=control).run(root)
+    assert first["cancelled"]
+
+    second = FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(**options)).run(root)
+
+    assert first["moved"] + second["moved"] == 600
+    assert all(path.startswith("documents/") for path in listing(root))
+
+
+def test_files_skipped_for_missing_folders_are_looked_at_again(tmp_path):
+    root = tmp_path / "in"
+    make_files(root, "a.jpg", "sub/b.txt")
+    options = OrganizeOptions(recursive=True, create_folders=False,
+                              state_path=tmp_path / "state.sqlite3")
+    first = FileOrganizer(DEFAULT_FOLDERS, options).run(root)
+    assert first["skipped"] == 2
+
+    (root / "images").mkdir()
+    (root / "documents").mkdir()
+    second = FileOrganizer(DEFAULT_FOLDERS, options).run(root)
+
+    assert second["moved"] == 2
+    assert listing(root) == ["documents/b.txt", "images/a.jpg"]
+
+
+def test_state_keeps_names_that_are_not_utf8(tmp_path):
+    root = tmp_path / "in"
+    odd = os.fsdecode(b"d\xe9")
+    make_files(root, f"sub/{odd}/a.jpg", f"sub/{odd}/{odd}.zzz")
+    options = OrganizeOptions(recursive=True, state_path=tmp_path / "state.sqlite3")
+
+    first = FileOrganizer(DEFAULT_FOLDERS, options).run(root)
+    # The moves changed the folders; this run lists them again and records them.
+    FileOrganizer(DEFAULT_FOLDERS, options).run(root)
+    third = FileOrganizer(DEFAULT_FOLDERS, options).run(root)
+
+    assert first["moved"] == 2 and first["errors"] == 0
+    assert third["found"] == 0 and third["unchanged_dirs"] == 3
+
+
+def test_move_after_incremental_copy_moves_the_sources(tmp_path):
+    root = tmp_path / "in"
+    make_files(root, "a.jpg", "sub/b.txt")
+    state = tmp_path / "state.sqlite3"
+
+    copied = FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(
+        recursive=True, state_path=state, transfer="copy")).run(root)
+    moved = FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(
+        recursive=True, state_path=state, transfer="move")).run(root)
+
+    assert copied["moved"] == 2
+    assert moved["found"] == 2
+    assert not (root / "a.jpg").exists() and not (root / "sub" / "b.txt").exists()
@@ -0,0 +1,141 @@
+import json
+import os
+
+from conftest import listing, make_files
+
+from file_organizer import (
+    DEFAULT_FOLDERS,
+    FileOrganizer,
+    MoveJournal,
+    OrganizeOptions,
+    Reporter,
+    latest_journal,
+    resume_journal,
+    undo_journal,
+)
+from file_organizer.journal import JOURNAL_KEEP, list_journals
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_journal_stores_absolute_paths(tmp_path, monkeypatch, organize):
+    make_files(tmp_path / "rel", "a.jpg", "b.txt")
+    monkeypatch.chdir(tmp_path)
+    summary = organize("rel", journal_dir=tmp_path / "journals")
+    records = read_records(summary["journal"])
+    assert records[0]["root"] == str(tmp_path / "rel")
+    for record in records:
+        if record["op"] == "plan":
+            assert os.path.isabs(record["src"]) and os.path.isabs(record["dst"])
+
+
+def test_undo_from_another_directory(tmp_path, monkeypatch, organize):
+    make_files(tmp_path / "rel", "a.jpg", "b.txt", "c.mp3")
+    monkeypatch.chdir(tmp_path)
+    summary = organize("rel", journal_dir=tmp_path / "journals")
+    assert summary["moved"] == 3
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+
+    undone = undo_journal(latest_journal(tmp_path / "journals"))
+
+    assert undone == dict(undone, moved=3, errors=0)
+    assert listing(tmp_path / "rel") == ["a.jpg", "b.txt", "c.mp3"]
+    assert listing(elsewhere) == []
+
+
+def test_undo_never_overwrites(tmp_path, organize):
+    make_files(tmp_path / "in", "a.jpg")
+    summary = organize(tmp_path / "in", journal_dir=tmp_path / "journals")
+    make_files(tmp_path / "in", "a.jpg", content=b"new")
+
+    undone = undo_journal(summary["journal"])
+
+    assert undone["errors"] == 1
+    assert (tmp_path / "in" / "a.jpg").read_bytes() == b"new"
+    assert (tmp_path / "in" / "images" / "a.jpg").read_bytes() == b"x"
+
+
+def test_resume_after_crash(tmp_path):
+    root = tmp_path / "in"
+    srcs = make_files(root, "a.jpg", "b.jpg", "c.jpg")
+    (root / "images").mkdir()
+    journal = MoveJournal.create(tmp_path / "journals", root)
+    for src in srcs:
+        journal.plan(src, root / "images" / os.path.basename(src))
+    journal.sync()
+    # The first rename happened, then the process died before recording it.
+    os.rename(srcs[0], root / "images" / "a.jpg")
+    journal._file.close()
+
+    summary = resume_journal(journal.path)
+
+    assert summary["moved"] == 2 and summary["errors"] == 0
+    assert listing(root) == ["images/a.jpg", "images/b.jpg", "images/c.jpg"]
+    ops = [record["op"] for record in read_records(journal.path)]
+    assert ops.count("done") == 3 and ops[-1] == "end"
+
+
+def test_watch_session_shares_one_journal(tmp_path):
+    journal_dir = tmp_path / "journals"
+    root = tmp_path / "in"
+    organizer = FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(journal_dir=journal_dir))
+    make_files(root, "big.txt")
+    organizer.run(root)
+    organizer.journal = MoveJournal.create(journal_dir, root)
+    for index in range(JOURNAL_KEEP + 5):
+        make_files(root, f"download{index}.jpg")
+        organizer.run(root)
+    organizer.journal.close()
+
+    journals = list_journals(journal_dir)
+    assert len(journals) == 2
+    undo_journal(journals[0])
+    assert (root / "big.txt").exists()
+
+
+def test_run_without_journal(tmp_path, organize):
+    make_files(tmp_path / "in", "a.jpg")
+    summary = organize(tmp_path / "in")
+    assert summary["moved"] == 1 and "journal" not in summary
+
+
+def test_journal_keeps_names_that_are_not_utf8(tmp_path, organize):
+    root = tmp_path / "in"
+    name = os.fsdecode(b"caf\xe9.jpg")
+    make_files(root, name)
+
+    summary = organize(root, journal_dir=tmp_path / "journals")
+    assert summary["moved"] == 1 and summary["errors"] == 0
+
+    undone = undo_journal(summary["journal"])
+    assert undone["moved"] == 1
+    assert listing(root) == [name]
+
+
+def test_unwritable_journal_does_not_stop_the_run(tmp_path):
+    blocker = tmp_path / "not-a-folder"
+    blocker.write_text("")
+    root = tmp_path / "in"
+    make_files(root, "a.jpg")
+    messages = []
+
+    class Log(Reporter):
+        def log(self, message):
+            messages.append(message)
+
+    summary = FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(journal_dir=blocker / "journals"),
+                            Log()).run(root)
+
+    assert summary["moved"] == 1 and "journal" not in summary
+    assert any(message.startswith("Warning: cannot write a move journal") for message in messages)
+
+
+def test_run_that_moves_nothing_leaves_no_journal(tmp_path, organize):
+    (tmp_path / "in").mkdir()
+    organize(tmp_path / "in", journal_dir=tmp_path / "journals")
+    assert list_journals(tmp_path / "journals") == []
@@ -0,0 +1,25 @@
+import threading
+
+from file_organizer import RunMetrics
+
+
+def test_buckets_created_from_several_threads_keep_every_count():
+    metrics = RunMetrics()
+    timed = [metrics.timed(lambda: None, f"c{n}", n) for n in range(200)]
+    start = threading.Barrier(2)
+
+    def workers():
+        start.wait()
+        for call in timed:
+            call()
+
+    thread = threading.Thread(target=workers)
+    thread.start()
+    start.wait()
+    for n in range(200):
+        metrics.moved(f"c{n}", n, 10)
+    thread.join()
+
+    assert all(metrics.categories[f"c{n}"]["files"] == 1 for n in range(200))
+    assert sum(bucket["bytes"] for bucket in metrics.volumes.values()) == 2000
+    assert metrics.to_dict()["counters"]["renames"] == 200
@@ -0,0 +1,37 @@
+import os
+
+from conftest import listing, make_files
+
+from file_organizer import DestinationIndex
+from file_organizer.transfer import move_file
+
+
+def test_move_file_refuses_to_overwrite(tmp_path):
+    src, dst = make_files(tmp_path, "a.txt", "b.txt")
+    try:
+        move_file(src, dst)
+    except FileExistsError:
+        pass
+    else:
+        raise AssertionError("move_file replaced an existing file")
+    assert os.path.exists(src)
+
+
+def test_file_appearing_after_index_is_not_overwritten(tmp_path, monkeypatch, organize):
+    root = tmp_path / "in"
+    make_files(root, "a.jpg", "images/old.jpg")
+    reserve = DestinationIndex.reserve
+
+    def reserve_then_write(self, dest_dir, name):
+        # Another program writes the name after the index listed images/.
+        path = reserve(self, dest_dir, name)
+        make_files(dest_dir, name, content=b"late")
+        return path
+
+    monkeypatch.setattr(DestinationIndex, "reserve", reserve_then_write)
+    summary = organize(root)
+
+    assert summary["errors"] == 1 and summary["moved"] == 0
+    assert (root / "images" / "a.jpg").read_bytes() == b"late"
+    assert (root / "a.jpg").read_bytes() == b"x"
+    assert listing(root) == ["a.jpg", "images/a.jpg", "images/old.jpg"]
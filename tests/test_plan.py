@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+from conftest import listing, make_files
+
+from file_organizer import DEFAULT_FOLDERS, FileOrganizer, MovePlan, OrganizeOptions
+
+
+def saved_plan(tmp_path, root):
+    organizer = FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(preview=True, record_plan=True))
+    organizer.run(root)
+    path = tmp_path / "plan.jsonl"
+    organizer.plan.save(path)
+    return path
+
+
+def edit_plan(path, **changes):
+    header, *rows = path.read_text(encoding="utf-8").splitlines()
+    rows = [json.dumps(dict(json.loads(row), **changes)) for row in rows]
+    path.write_text("\n".join([header, *rows]) + "\n", encoding="utf-8")
+
+
+def test_apply_saved_plan(tmp_path):
+    root = tmp_path / "in"
+    make_files(root, "a.jpg", "b.txt")
+    plan = MovePlan.load(saved_plan(tmp_path, root))
+
+    summary = FileOrganizer(DEFAULT_FOLDERS).run(plan.root, plan=plan)
+
+    assert summary["moved"] == 2
+    assert listing(root) == ["documents/b.txt", "images/a.jpg"]
+
+
+@pytest.mark.parametrize("changes", [
+    {"dst": "../elsewhere/b.txt"},
+    {"dst": "images/b.txt"},
+    {"src": "../outside.txt"},
+    {"link": "../outside.txt"},
+    {"category": "..", "dst": "../b.txt"},
+    {"category": "documents/../..", "dst": "../b.txt"},
+])
+def test_edited_plan_cannot_leave_its_folders(tmp_path, changes):
+    root = tmp_path / "in"
+    make_files(root, "b.txt")
+    path = saved_plan(tmp_path, root)
+    edit_plan(path, **changes)
+
+    with pytest.raises(ValueError):
+        MovePlan.load(path)
+    assert listing(root) == ["b.txt"]
+
+
+def test_plan_cannot_escape_through_a_symlink(tmp_path):
+    root = tmp_path / "in"
+    make_files(root, "b.txt")
+    (tmp_path / "elsewhere").mkdir()
+    (root / "documents").symlink_to(tmp_path / "elsewhere")
+    path = saved_plan(tmp_path, root)
+
+    with pytest.raises(ValueError):
+        MovePlan.load(path)
+
+
+@pytest.mark.parametrize("filename", ["plan.jsonl", "plan.csv"])
+def test_plan_keeps_names_that_are_not_utf8(tmp_path, filename):
+    root = tmp_path / "in"
+    name = os.fsdecode(b"caf\xe9.jpg")
+    make_files(root, name)
+    organizer = FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(preview=True, record_plan=True))
+    organizer.run(root)
+    path = tmp_path / filename
+
+    organizer.plan.save(path)
+    plan = MovePlan.load(path, str(root))
+    summary = FileOrganizer(DEFAULT_FOLDERS).run(plan.root, plan=plan)
+
+    assert summary["moved"] == 1
+    assert listing(root) == [f"images/{name}"]
+    assert sorted(os.listdir(tmp_path)) == sorted(["in", filename])
+
+
+def test_failed_save_leaves_no_temp_file(tmp_path):
+    root = tmp_path / "in"
+    make_files(root, "a.jpg")
+    organizer = FileOrganizer(DEFAULT_FOLDERS, OrganizeOptions(preview=True, record_plan=True))
+    organizer.run(root)
+    (tmp_path / "plan.jsonl").mkdir()
+
+    with pytest.raises(OSError):
+        organizer.plan.save(tmp_path / "plan.jsonl")
+    assert not (tmp_path / "plan.jsonl.tmp").exists()
@@ -0,0 +1,49 @@
+import time
+
+from file_organizer import RuleMatcher
+from file_organizer.rules import CHUNK_PATTERNS
+
+
+def categories(matcher, *names):
+    return [matcher.match(name)[0] for name in names]
+
+
+def test_first_matching_rule_wins_across_kinds():
+    matcher = RuleMatcher({"jpg": "images"}, [
+        {"glob": "img_*.raw", "category": "raw"},
+        {"regex": r"^\d{4}-", "category": "dated"},
+        {"glob": "*final*.doc", "category": "final"},
+        {"suffix": "jpg", "category": "photos"},
+        {"glob": "IMG_*", "category": "camera"},
+        {"glob": "*.tar.*", "category": "tarballs"},
+        {"glob": "readme", "category": "docs"},
+    ])
+
+    assert categories(matcher, "IMG_1.RAW", "2026-IMG_2.jpg", "IMG_3.jpg", "IMG_4.png",
+                      "report_final_v2.DOC", "a.tar.xz", "README", "readme.txt", "x.gif") == [
+        "raw", "dated", "photos", "camera", "final", "tarballs", "docs", None, None]
+    assert matcher.match("plain.jpg") == ("photos", True)
+
+
+def test_rule_order_holds_across_pattern_chunks():
+    rules = [{"regex": f"^nomatch{n}$", "category": f"c{n}"} for n in range(CHUNK_PATTERNS * 3)]
+    rules.append({"regex": "target", "category": "late"})
+    rules.insert(CHUNK_PATTERNS + 5, {"regex": "tar", "category": "early"})
+    matcher = RuleMatcher({}, rules)
+
+    assert categories(matcher, "the_target", "nomatch250", "other") == ["early", "c250", None]
+
+
+def test_large_rule_sets_stay_fast():
+    rules = [{"glob": f"pre{n}_*", "category": f"c{n % 50}"} for n in range(20000)]
+    matcher = RuleMatcher({"txt": "documents"}, rules)
+    names = [f"pre{n}_file.txt" for n in range(0, 20000, 20)] + ["unmatched.txt"] * 1000
+
+    started = time.perf_counter()
+    found = [matcher.match(name)[0] for name in names]
+    elapsed = time.perf_counter() - started
+
+    assert found[:3] == ["c0", "c20", "c40"] and found[-1] == "documents"
+    # Thousands of rules must cost about as much as a couple of dict lookups,
+    # not one test per rule (which takes seconds here).
+    assert elapsed / len(names) < 50e-6
@@ -0,0 +1,23 @@
+from conftest import listing, make_files
+
+
+def test_preview_creates_no_shard_folders(tmp_path, organize):
+    root = tmp_path / "in"
+    make_files(root, "a.jpg", "b.jpg", "images/keep.jpg")
+
+    summary = organize(root, preview=True, shard="date", create_folders=False)
+
+    assert summary["categories"] == {"images": 2}
+    assert listing(root) == ["a.jpg", "b.jpg", "images/keep.jpg"]
+    assert sorted(p.name for p in root.iterdir()) == ["a.jpg", "b.jpg", "images"]
+    assert [p.name for p in (root / "images").iterdir()] == ["keep.jpg"]
+
+
+def test_count_shards_start_after_preview(tmp_path, organize):
+    root = tmp_path / "in"
+    make_files(root, *(f"f{i}.jpg" for i in range(5)))
+    organize(root, preview=True, shard="count:2")
+
+    organize(root, shard="count:2")
+
+    assert sorted(p.name for p in (root / "images").iterdir()) == ["00001", "00002", "00003"]
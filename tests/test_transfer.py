@@ -0,0 +1,24 @@
+import errno
+import os
+
+from conftest import listing, make_files
+
+from file_organizer.transfer import move_file
+
+
+def test_cross_device_move_copies_then_deletes(tmp_path, monkeypatch):
+    src, = make_files(tmp_path, "a.txt", content=b"payload")
+    dst = tmp_path / "b.txt"
+    rename = os.rename
+
+    def rename_across_devices(a, b):
+        if os.fspath(a) == src:
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return rename(a, b)
+
+    monkeypatch.setattr(os, "rename", rename_across_devices)
+    move_file(src, dst, verify=True)
+
+    assert not os.path.exists(src)
+    assert dst.read_bytes() == b"payload"
+    assert listing(tmp_path) == ["b.txt"]
@@ -0,0 +1,22 @@
+import sys
+
+import pytest
+
+from file_organizer.watch import InotifySource
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_folder_created_and_removed_before_handling(tmp_path):
+    source = InotifySource(tmp_path, recursive=True)
+    try:
+        (tmp_path / "tmpdir").mkdir()
+        (tmp_path / "tmpdir").rmdir()
+        (tmp_path / "kept").mkdir()
+        (tmp_path / "kept" / "a.txt").write_text("x")
+
+        paths = source.wait(1)
+
+        assert str(tmp_path / "kept" / "a.txt") in paths
+        assert str(tmp_path / "kept") in source.watches.values()
+    finally:
+        source.close()